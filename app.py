@@ -1,40 +1,74 @@
 import os
+import json
 import dotenv
-import requests_cache
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
 
 from src.server import Server
+from src.warmup import WarmupScheduler
 
 dotenv.load_dotenv()
 
-app = FastAPI()
 server = Server(
     gov_api_key=os.getenv("GOV_API_KEY"),
     genai_api_key=os.getenv("GENAI_API_KEY"),
     news_api_key=os.getenv("NEWS_API_KEY"),
 )
 
-requests_cache.install_cache(
-    cache_name="botenders_gov_simplify_cache",
-    expire_after=3600 * 24, # Policies rarely change on a daily basis, so cache for 24 hours
-    allowable_methods=["GET"],
-)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep agency caches warm from inside the app (prefer `python -m src.warmup` with several workers)
+    scheduler = None
+    if os.getenv("WARMUP_IN_APP") == "1":
+        scheduler = WarmupScheduler(server)
+        scheduler.start()
+    yield
+    if scheduler:
+        scheduler.stop()
+    await server.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/news/{query}")
 async def fetch_news(query: str):
-    return server.fetch_news(query)
+    return await server.fetch_news_async(query)
+
+
+@app.get("/stats")
+def stats():
+    return server.stats()
 
 
 @app.post("/message/{agency}")
 async def handle_message(request: Request, agency: str):
     payload = await request.json()
-    response = server.handle_message(payload["sessionId"], agency, payload["message"])
+    response = await server.handle_message_async(
+        payload["sessionId"], agency, payload["message"]
+    )
     response["timestamp"] = datetime.now().isoformat()
     return response
 
 
+@app.post("/message/{agency}/stream")
+async def stream_message(request: Request, agency: str):
+    payload = await request.json()
+
+    async def events():
+        async for event in server.stream_message(
+            payload["sessionId"], agency, payload["message"]
+        ):
+            if event["event"] == "done":
+                event["data"]["timestamp"] = datetime.now().isoformat()
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 if __name__ == "__main__":
     import uvicorn
 
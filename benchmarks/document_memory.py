@@ -0,0 +1,167 @@
+"""
+Peak RSS of holding an agency's documents for a prompt build, as API dicts vs `Document`.
+
+Writes a synthetic agency of API-shaped documents to a temporary corpus store, then
+loads it and renders the whole-corpus prompt in a fresh process per representation:
+
+    python -m benchmarks.document_memory --documents 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.corpus import CorpusStore
+
+AGENCY = "EPA"
+DOCUMENT_TYPES = ["Rule", "Proposed Rule", "Notice"]
+_WORDS = (
+    "air quality emission standard source permit state plan review rule notice "
+    "hazardous pollutant compliance facility reporting requirement amendment"
+).split()
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _raw_document(i: int, rng: random.Random, summary_words: int) -> dict:
+    docket = f"{AGENCY}-HQ-OAR-{2000 + i % 25}-{i // 40:04d}"
+    posted = f"{2000 + i % 25}-{1 + i % 12:02d}-{1 + i % 28:02d}T05:00:00Z"
+    modified = posted.replace("05:00:00", f"{i % 24:02d}:{i % 60:02d}:11")
+    return {
+        "id": f"{docket}-{i % 40:04d}",
+        "type": "documents",
+        "attributes": {
+            "documentType": DOCUMENT_TYPES[i % 3],
+            "lastModifiedDate": modified,
+            "highlightedContent": "",
+            "frDocNum": f"{2000 + i % 25}-{i:05d}",
+            "withdrawn": i % 50 == 0,
+            "agencyId": AGENCY,
+            "allowLateComments": False,
+            "commentEndDate": None,
+            "title": " ".join(rng.choices(_WORDS, k=12)).title(),
+            "postedDate": posted,
+            "docketId": docket,
+            "subtype": None,
+            "commentStartDate": None,
+            "openForComment": False,
+            "objectId": f"09000064{i:08x}",
+        },
+        "links": {
+            "self": f"https://api.regulations.gov/v4/documents/{docket}-{i % 40:04d}"
+        },
+        "summary": " ".join(rng.choices(_WORDS, k=summary_words)),
+    }
+
+
+def _write_store(path: str, documents: int, summary_words: int) -> None:
+    CorpusStore(path)  # creates the schema
+    rng = random.Random(0)
+    rows = (
+        (
+            AGENCY,
+            doc["id"],
+            doc["attributes"]["postedDate"],
+            doc["attributes"]["lastModifiedDate"],
+            json.dumps(doc),
+        )
+        for doc in (_raw_document(i, rng, summary_words) for i in range(documents))
+    )
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO documents (agency, id, posted_date, last_modified, data)"
+            " VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def _measure(mode: str, path: str) -> dict:
+    # Imported here so the baseline includes the prompt module in both modes
+    from src.prompt import render_prompt
+
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    if mode == "dict":
+        # How documents were held before: the decoded API objects as-is
+        with sqlite3.connect(path) as conn:
+            rows = conn.execute(
+                "SELECT data FROM documents WHERE agency = ? ORDER BY posted_date DESC, id",
+                (AGENCY,),
+            )
+            documents = [json.loads(data) for (data,) in rows]
+    else:
+        documents = CorpusStore(path).documents(AGENCY)
+    loaded = _peak_rss_mb()
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    prompt = render_prompt(documents)
+    return {
+        "mode": mode,
+        "documents": len(documents),
+        "load_s": round(load_seconds, 2),
+        "render_s": round(time.perf_counter() - started, 2),
+        "prompt_mb": round(len(prompt) / 1e6, 1),
+        "baseline_mb": round(baseline, 1),
+        "loaded_mb": round(loaded, 1),
+        "peak_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=50_000)
+    parser.add_argument("--summary-words", type=int, default=80)
+    parser.add_argument("--mode", choices=["dict", "document"], help=argparse.SUPPRESS)
+    parser.add_argument("--store", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(_measure(args.mode, args.store)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.sqlite")
+        _write_store(path, args.documents, args.summary_words)
+        print(f"{args.documents} documents, {args.summary_words}-word summaries")
+        print(
+            f"{'mode':<10}{'load s':>8}{'render s':>10}{'loaded MB':>11}{'peak MB':>9}"
+            f"{'held MB':>9}"
+        )
+        for mode in ("dict", "document"):
+            result = json.loads(
+                subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "benchmarks.document_memory",
+                        "--mode",
+                        mode,
+                        "--store",
+                        path,
+                    ],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+            )
+            print(
+                f"{mode:<10}{result['load_s']:>8}{result['render_s']:>10}"
+                f"{result['loaded_mb']:>11}{result['peak_mb']:>9}"
+                f"{round(result['loaded_mb'] - result['baseline_mb'], 1):>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
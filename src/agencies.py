@@ -1,56 +1,707 @@
 import re
+import html
+import math
+import asyncio
+import threading
 import requests
-import requests_cache
+from collections import deque
 from collections.abc import Iterable
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor
-from requests_cache.backends.sqlite import SQLiteCache
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import date, datetime, timedelta, timezone
+from requests.adapters import HTTPAdapter
+from requests_cache.session import OriginalSession
+
+from src import http_cache
+from src.documents import Document
+
+
+class PermanentSummaryError(ValueError):
+    """
+    A document that cannot be summarized until it changes, e.g. it has no HTML file.
+    """
+
+
+# Client errors that are worth retrying
+_TRANSIENT_CLIENT_STATUSES = {408, 429}
+
+
+def is_permanent_failure(error: BaseException) -> bool:
+    """
+    Whether a summary failure will recur until the document changes: no HTML file, no
+    <PRE> block, or an HTTP client error other than a timeout or rate limit.
+    """
+    while error is not None:
+        if isinstance(error, PermanentSummaryError):
+            return True
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            status = error.response.status_code
+            return 400 <= status < 500 and status not in _TRANSIENT_CLIENT_STATUSES
+        error = error.__cause__
+    return False
 
 GOV_GSA_URL = "https://api.regulations.gov/v4/documents"
+DEFAULT_POOL_SIZE = http_cache.DEFAULT_POOL_SIZE
+
+# The API serves at most 20 pages of 250 per query; larger listings are split into
+# postedDate windows (see `_iter_sharded_pages`)
+PAGE_SIZE = 250
+MAX_PAGE_NUMBER = 20
+MAX_LISTING_RESULTS = PAGE_SIZE * MAX_PAGE_NUMBER
+SHARD_FILL = 0.8  # target share of the cap per window, so most windows need no re-split
+
+# Federal Register .htm pages keep the document body in a single <PRE> block
+_PRE_BLOCK_RE = re.compile(r"<pre\b[^>]*>(.*?)(?:</pre\s*>|\Z)", re.I | re.S)
+_MARKUP_RE = re.compile(r"<!--.*?(?:-->|\Z)|</?[a-zA-Z][^>]*>|<[!?][^>]*>", re.S)
+
+# Non-essential lines, tested against the raw line before whitespace is normalized
+_REMOVABLE_LINE_RE = re.compile(
+    r"\[\s*Federal Register.*\]\s*$"  # Federal Register header
+    r"|\[\s*DOCID:.*\]\s*$"  # DOCID line
+    r"|\s*\[Page.*\]\s*$"  # Page numbers
+    r"|BILLING CODE"  # Billing code
+    r"|From the Federal Register Online"  # Source line
+    r"|\[FR Doc.*\]\s*$"  # FR Doc line
+    r"|\s*_{3,}\s*$"  # Separator lines
+)
+_LABEL_END_RE = re.compile(r"\w:$")
+
+_PRE_START_RE = re.compile(r"<pre\b[^>]*>", re.I)
+_PRE_END_RE = re.compile(r"</pre\s*>", re.I)
+# Raw bytes after which the summary section may be over: a line ending in a label, or
+# the end of the block (see `_stream_summary_in_pool`)
+_SUMMARY_START_BYTES_RE = re.compile(rb"SUMMARY:")
+_PRE_END_BYTES_RE = re.compile(rb"</pre\s*>", re.I)
+_SECTION_END_BYTES_RE = re.compile(rb":[ \t\r]*\n|</pre\s*>", re.I)
+_MARKUP_START_RE = re.compile(r"<(?:/?[a-zA-Z]|[!?])")
+SUMMARY_CHUNK_SIZE = 16 * 1024
+DEFAULT_SUMMARY_WORKERS = 16
+
+_streaming_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session(streaming=False):
+    """
+    Returns a process-wide keep-alive session for Regulations.gov calls.
+
+    The default session is the shared HTTP cache (see `src.http_cache`). The streaming
+    session bypasses it, since a cached session reads the whole body before returning
+    and a partially read body cannot be cached anyway.
+    """
+    global _streaming_session
+    if not streaming:
+        return http_cache.get_session()
+    with _session_lock:
+        if _streaming_session is None:
+            session = OriginalSession()
+            adapter = HTTPAdapter(
+                pool_connections=DEFAULT_POOL_SIZE, pool_maxsize=DEFAULT_POOL_SIZE
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _streaming_session = session
+        return _streaming_session
+
+
+def _agency_page_url(
+    api_key, agency, filters, page, last_modified_since=None, window=None, sort=None
+):
+    url = f"{GOV_GSA_URL}?filter[agencyId]={agency}&filter[documentType]={filters}&api_key={api_key}&page[size]={PAGE_SIZE}&page[number]={page}"
+    if last_modified_since:
+        url += f"&filter[lastModifiedDate][ge]={last_modified_since}"
+    if window:
+        url += f"&filter[postedDate][ge]={window[0]}&filter[postedDate][le]={window[1]}"
+    if sort:
+        url += f"&sort={sort}"
+    return url
+
+
+def _fetch_agency_page(
+    session,
+    api_key,
+    agency,
+    filters,
+    page,
+    last_modified_since=None,
+    window=None,
+    sort=None,
+):
+    """
+    Fetches a single listing page and returns its decoded JSON body.
+    """
+    res = session.get(
+        _agency_page_url(
+            api_key, agency, filters, page, last_modified_since, window, sort
+        )
+    )
+    res.raise_for_status()
+    return res.json()
+
+
+def _filter_page(page_json, filters):
+    return [
+        Document.from_dict(result)
+        for result in page_json.get("data", [])
+        if result.get("attributes", {}).get("documentType") in filters
+    ]
+
+
+def _total_pages(first_page, required=True):
+    total_pages = first_page.get("meta", {}).get("totalPages", 0)
+    if not total_pages and required:
+        raise Exception("No pages found in metadata for the given agency.")
+    return total_pages
+
+
+def _total_elements(first_page):
+    return first_page.get("meta", {}).get("totalElements", 0)
+
+
+def _split_window(window, parts):
+    """
+    Splits an inclusive (start, end) date window into up to `parts` adjacent windows.
+    """
+    start, end = window
+    days = (end - start).days + 1
+    parts = max(1, min(parts, days))
+    bounds = [start + timedelta(days=days * i // parts) for i in range(parts + 1)]
+    return [(lo, hi - timedelta(days=1)) for lo, hi in zip(bounds, bounds[1:])]
+
+
+def _shard_count(total_elements):
+    return max(2, math.ceil(total_elements / (MAX_LISTING_RESULTS * SHARD_FILL)))
+
+
+# Stable orders for paging through a window, and the reverse one for a day over the cap
+_WINDOW_SORT = "postedDate,documentId"
+_WINDOW_SORT_REVERSE = "postedDate,-documentId"
+
+
+def _needs_shards(first_page, sharded=None):
+    if sharded is not None:
+        return sharded
+    return _total_elements(first_page) > MAX_LISTING_RESULTS
+
+
+def _iter_sharded_pages(
+    session, api_key, agency, filters, max_workers, last_modified_since, total_elements
+):
+    """
+    Lists an agency in postedDate windows small enough for the API's page cap.
+
+    The agency's posting history (from its earliest document to tomorrow) is split into
+    windows sized for `total_elements`. Each window's first page reports its own size,
+    and a window still over the cap is split again, down to single days. A single day
+    over the cap is also listed in reverse order, which reaches twice as many.
+
+    Windows and pages are fetched in parallel with at most `2 * max_workers` requests
+    queued at once, so memory stays bounded however far the consumer lags. Documents
+    are deduplicated by id across windows.
+
+    Yields:
+        tuple: (pages known so far, documents) for each page, in completion order.
+
+    Raises:
+        RuntimeError: If the agency has documents but the earliest ones carry no
+            postedDate, so there is no date to start the windows from.
+    """
+    earliest_page = _fetch_agency_page(
+        session, api_key, agency, filters, 1, last_modified_since, sort="postedDate"
+    )
+    results = earliest_page.get("data", [])
+    if not results and not _total_elements(earliest_page):
+        return  # nothing to list
+    earliest = [
+        posted
+        for result in results
+        if (posted := result.get("attributes", {}).get("postedDate"))
+    ]
+    if not earliest:
+        # Paging without windows would stop at the cap and drop the rest unnoticed
+        raise RuntimeError(
+            f"Cannot list {agency} in postedDate windows: its earliest documents have "
+            f"no postedDate ({_total_elements(earliest_page)} documents in total)."
+        )
+    # postedDate filters use US Eastern dates; pad a day on either side
+    start = date.fromisoformat(min(earliest)[:10]) - timedelta(days=1)
+    end = datetime.now(timezone.utc).date() + timedelta(days=1)
+
+    seen = set()
+    total_pages = 0
+    windows = _split_window((start, end), _shard_count(total_elements))
+    queued = deque((window, 1, _WINDOW_SORT) for window in windows)
+    pending = {}
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while queued or pending:
+            while queued and len(pending) < 2 * max_workers:
+                window, page, sort = task = queued.popleft()
+                future = executor.submit(
+                    _fetch_agency_page,
+                    session,
+                    api_key,
+                    agency,
+                    filters,
+                    page,
+                    last_modified_since,
+                    window,
+                    sort,
+                )
+                pending[future] = task
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window, page, sort = pending.pop(future)
+                page_json = future.result()
+                if page == 1 and sort == _WINDOW_SORT:
+                    count = _total_elements(page_json)
+                    if count > MAX_LISTING_RESULTS and window[0] < window[1]:
+                        queued.extend(
+                            (part, 1, _WINDOW_SORT)
+                            for part in _split_window(window, _shard_count(count))
+                        )
+                        continue
+                    pages = min(math.ceil(count / PAGE_SIZE), MAX_PAGE_NUMBER)
+                    queued.extend((window, p, sort) for p in range(2, pages + 1))
+                    if count > MAX_LISTING_RESULTS:
+                        # A single day over the cap: list it from the other end as well
+                        reverse_pages = min(
+                            math.ceil((count - MAX_LISTING_RESULTS) / PAGE_SIZE),
+                            MAX_PAGE_NUMBER,
+                        )
+                        queued.extend(
+                            (window, p, _WINDOW_SORT_REVERSE)
+                            for p in range(1, reverse_pages + 1)
+                        )
+                        pages += reverse_pages
+                        if count > 2 * MAX_LISTING_RESULTS:
+                            print(
+                                f"{agency} posted {count} documents on {window[0]}; "
+                                f"only {2 * MAX_LISTING_RESULTS} can be listed"
+                            )
+                    total_pages += pages
+
+                docs = []
+                for doc in _filter_page(page_json, filters):
+                    if doc.id not in seen:
+                        seen.add(doc.id)
+                        docs.append(doc)
+                yield total_pages, docs
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _iter_listing_pages(
+    session,
+    api_key,
+    agency,
+    filters,
+    max_workers,
+    last_modified_since=None,
+    sharded=None,
+    ordered=False,
+):
+    """
+    Lists an agency page by page, starting from a single fetch of page 1.
 
+    Page 1 carries both the listing's size and its first documents. A listing over the
+    page cap continues in postedDate windows (see `_iter_sharded_pages`); otherwise the
+    remaining pages are fetched concurrently and yielded in page order if `ordered`,
+    else in completion order.
 
-def fetch_agency(api_key, agency, filters="Notice,Rule,Proposed Rule"):
+    Yields:
+        tuple: (total_pages, documents) for each page, as `Document` records.
+    """
+    first_page = _fetch_agency_page(
+        session, api_key, agency, filters, 1, last_modified_since
+    )
+    total_pages = _total_pages(first_page, required=not last_modified_since)
+    if _needs_shards(first_page, sharded):
+        yield from _iter_sharded_pages(
+            session,
+            api_key,
+            agency,
+            filters,
+            max_workers,
+            last_modified_since,
+            _total_elements(first_page),
+        )
+        return
+    yield total_pages, _filter_page(first_page, filters)
+
+    if total_pages > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    _fetch_agency_page,
+                    session,
+                    api_key,
+                    agency,
+                    filters,
+                    page,
+                    last_modified_since,
+                )
+                for page in range(2, total_pages + 1)
+            ]
+            for future in futures if ordered else as_completed(futures):
+                yield total_pages, _filter_page(future.result(), filters)
+
+
+def fetch_agency(
+    api_key,
+    agency,
+    filters="Notice,Rule,Proposed Rule",
+    max_workers=DEFAULT_POOL_SIZE,
+    use_async=False,
+    last_modified_since=None,
+    sharded=None,
+):
     """
     Fetch documents for a specific agency filtered by document type.
 
+    Page 1 is used both for the `totalPages` metadata and for its documents; the
+    remaining pages are fetched concurrently over a pooled keep-alive session.
+    Listings beyond the API's page cap are fetched in postedDate windows instead
+    (see `iter_agency_pages`), in which case documents are not in page order.
+
     Args:
         api_key (str): API key for the Regulations.gov API.
         agency (str): The agency ID to fetch documents for.
         filters (str): Document types to include in the results.
+        max_workers (int): Maximum number of pages fetched at the same time.
+        use_async (bool): If True, run the listing through `fetch_agency_async` on an
+            asyncio event loop instead of in the calling thread.
+        last_modified_since (str, optional): Only list documents modified at or after
+            this time ("YYYY-MM-DD HH:MM:SS"). An empty result is not an error in this mode.
+        sharded (bool, optional): Force the windowed listing on or off; by default it
+            is used when the listing exceeds `MAX_LISTING_RESULTS`.
 
     Returns:
-        list: A list of documents that match the specified agency and document types.
+        list: The matching documents, as `Document` records.
     """
+    if use_async:
+        return asyncio.run(
+            fetch_agency_async(
+                api_key,
+                agency,
+                filters,
+                max_workers=max_workers,
+                last_modified_since=last_modified_since,
+                sharded=sharded,
+            )
+        )
 
-    # Fetch metadata to determine total pages
-    metadata_url = f"{GOV_GSA_URL}?filter[agencyId]={agency}&filter[documentType]={filters}&api_key={api_key}&page[size]=250&page[number]=1"
-    metadata_res = requests.get(metadata_url)
-    metadata_res.raise_for_status()
-    metadata = metadata_res.json().get("meta", {})
-    total_pages = metadata.get("totalPages", 0)
+    return [
+        doc
+        for _, docs in _iter_listing_pages(
+            _get_session(),
+            api_key,
+            agency,
+            filters,
+            max_workers,
+            last_modified_since,
+            sharded,
+            ordered=True,
+        )
+        for doc in docs
+    ]
+
+
+def iter_agency_pages(
+    api_key,
+    agency,
+    filters="Notice,Rule,Proposed Rule",
+    max_workers=DEFAULT_POOL_SIZE,
+    last_modified_since=None,
+    sharded=None,
+):
+    """
+    Lists an agency's documents page by page, yielding each page as soon as it arrives.
 
-    if not total_pages:
-        raise Exception("No pages found in metadata for the given agency.")
+    Unlike `fetch_agency`, pages are yielded in completion order rather than page order,
+    so consumers can start on the first documents while later pages are still in flight.
 
-    # Fetch documents across all pages
-    results = []
-    for page in range(1, total_pages + 1):
-        url = f"{GOV_GSA_URL}?filter[agencyId]={agency}&filter[documentType]={filters}&api_key={api_key}&page[size]=250&page[number]={page}"
-        res = requests.get(url)
-        res.raise_for_status()
-        data = res.json().get("data", [])
+    The API lists at most `MAX_LISTING_RESULTS` documents per query. Larger listings
+    are split into postedDate windows that each fit under that cap and are fetched in
+    parallel, with documents deduplicated by id (see `_iter_sharded_pages`); the
+    reported total then grows as windows are sized.
 
-        # Filter and add relevant documents
-        results.extend(
-            result
-            for result in data
-            if result.get("attributes", {}).get("documentType") in filters
-        )
+    Args:
+        api_key (str): API key for the Regulations.gov API.
+        agency (str): The agency ID to fetch documents for.
+        filters (str): Document types to include in the results.
+        max_workers (int): Maximum number of pages fetched at the same time.
+        last_modified_since (str, optional): Only list documents modified at or after
+            this time ("YYYY-MM-DD HH:MM:SS", US Eastern).
+        sharded (bool, optional): Force the windowed listing on or off; by default it
+            is used when the listing exceeds `MAX_LISTING_RESULTS`.
+
+    Yields:
+        tuple: (total_pages, documents) for each page, as `Document` records.
+    """
+    yield from _iter_listing_pages(
+        _get_session(),
+        api_key,
+        agency,
+        filters,
+        max_workers,
+        last_modified_since,
+        sharded,
+    )
 
-    return results
 
+async def fetch_agency_async(
+    api_key,
+    agency,
+    filters="Notice,Rule,Proposed Rule",
+    max_workers=DEFAULT_POOL_SIZE,
+    last_modified_since=None,
+    sharded=None,
+):
+    """
+    Asyncio variant of `fetch_agency` for callers that already run inside an event loop.
 
-def download_and_parse_htm(file_url, return_summary_only=False, return_raw_htm=False):
+    The listing runs in a worker thread with the same pooled session and at most
+    `max_workers` pages in flight, so the event loop is never blocked on it.
+
+    Args:
+        api_key (str): API key for the Regulations.gov API.
+        agency (str): The agency ID to fetch documents for.
+        filters (str): Document types to include in the results.
+        max_workers (int): Maximum number of pages fetched at the same time.
+        last_modified_since (str, optional): Only list documents modified at or after this time.
+        sharded (bool, optional): Force the windowed listing on or off.
+
+    Returns:
+        list: The matching documents, as `Document` records.
+    """
+    return await asyncio.to_thread(
+        fetch_agency,
+        api_key,
+        agency,
+        filters,
+        max_workers=max_workers,
+        last_modified_since=last_modified_since,
+        sharded=sharded,
+    )
+
+
+def _extract_pre_text(raw_html):
+    """
+    Returns the text of the first <PRE> block without building a DOM.
+
+    Markup inside the block becomes a line break and entities are decoded, which matches
+    `BeautifulSoup(raw_html, "html.parser").find("pre").get_text(separator="\n")` for the
+    cleaning below (blank lines are dropped either way).
+    """
+    match = _PRE_BLOCK_RE.search(raw_html)
+    if not match:
+        raise PermanentSummaryError("No <PRE> tag found in the document.")
+    return _decode_pre_text(match.group(1))
+
+
+def _decode_pre_text(text):
+    return html.unescape(_MARKUP_RE.sub("\n", text))
+
+
+def _clean_line(line):
+    """
+    Returns the whitespace-normalized line, or None if it is blank or non-essential.
+    """
+    words = line.split()
+    if not words or _REMOVABLE_LINE_RE.match(line):
+        return None
+    return " ".join(words)
+
+
+def _iter_pre_lines(chunks, final=True):
+    """
+    Yields the raw lines of the first <PRE> block from an iterable of decoded text chunks.
+
+    Text is only consumed up to the last complete line, and never past the start of
+    markup that has not been closed yet, so the lines match `_extract_pre_text`. With
+    `final` False the chunks are only the start of the page: a missing block and the
+    unconsumed rest are left for a later call with more of the page.
+    """
+    buffer = ""
+    in_pre = False
+    for chunk in chunks:
+        buffer += chunk
+        if not in_pre:
+            match = _PRE_START_RE.search(buffer)
+            if not match:
+                # Keep a possibly split "<pre" tag for the next chunk
+                buffer = buffer[buffer.rfind("<") :] if "<" in buffer else ""
+                continue
+            buffer = buffer[match.end() :]
+            in_pre = True
+
+        if end := _PRE_END_RE.search(buffer):
+            yield from _decode_pre_text(buffer[: end.start()]).split("\n")
+            return
+
+        cut = buffer.rfind("\n") + 1
+        open_comment = buffer.rfind("<!--", 0, cut)
+        if open_comment > buffer.rfind("-->", 0, cut):
+            cut = open_comment
+        if open_markup := _MARKUP_START_RE.search(
+            buffer, buffer.rfind(">", 0, cut) + 1, cut
+        ):
+            cut = open_markup.start()
+        if cut:
+            yield from _decode_pre_text(buffer[:cut]).split("\n")
+            buffer = buffer[cut:]
+
+    if not final:
+        return
+    if not in_pre:
+        raise PermanentSummaryError("No <PRE> tag found in the document.")
+    yield from _decode_pre_text(buffer).split("\n")
+
+
+def _stream_summary(response, chunk_size=SUMMARY_CHUNK_SIZE):
+    """
+    Reads a streamed response only until its `SUMMARY:` section ends and returns the summary.
+    """
+    if response.encoding is None:
+        response.encoding = "utf-8"
+    chunks = response.iter_content(chunk_size=chunk_size, decode_unicode=True)
+    cleaned_lines = (
+        line for line in map(_clean_line, _iter_pre_lines(chunks)) if line
+    )
+    return _extract_summary(cleaned_lines)
+
+
+def _clean_htm_lines(raw_html):
+    """
+    Extracts the main <PRE> block of a Federal Register page and returns its non-empty cleaned lines.
+    """
+    cleaned_lines = []
+    for line in _extract_pre_text(raw_html).split("\n"):
+        if line := _clean_line(line):
+            cleaned_lines.append(line)
+    return cleaned_lines
+
+
+def _extract_summary(cleaned_lines):
+    """
+    Returns the `SUMMARY:` paragraph from cleaned lines, or a placeholder if it is missing.
+    """
+    return _summary_section(cleaned_lines)[0]
+
+
+def _summary_section(cleaned_lines):
+    """
+    Returns the summary as `_extract_summary` does, and whether a new section ended it.
+    """
+    summary_lines = []
+    in_summary = False
+    for line in cleaned_lines:
+        if line.startswith("SUMMARY:"):
+            in_summary = True
+            summary_lines.append(line.replace("SUMMARY:", "").strip())
+        elif in_summary:
+            if not line or line.endswith(":"):  # Stop at a new section
+                return " ".join(summary_lines).strip(), True
+            summary_lines.append(line)
+
+    summary = " ".join(summary_lines).strip() if summary_lines else "Summary not found."
+    return summary, False
+
+
+def _join_cleaned_lines(cleaned_lines):
+    """
+    Joins cleaned lines into the full document text with normalized spacing.
+
+    Lines ending in a `label:` are joined to the next line with a single space, which is
+    what the former `re.sub(r"(\w+:)\s+", r"\1 ", ...)` pass did across line breaks.
+    """
+    parts = []
+    for line in cleaned_lines:
+        parts.append(line)
+        parts.append(" " if _LABEL_END_RE.match(line, len(line) - 2) else "\n")
+    return "".join(parts[:-1])
+
+
+def parse_htm(raw_html):
+    """
+    Parses a Federal Register .htm page once and returns both its summary and full cleaned text.
+
+    Args:
+        raw_html (str): Raw HTML of the document.
+
+    Returns:
+        tuple: (summary, cleaned_text)
+    """
+    cleaned_lines = _clean_htm_lines(raw_html)
+    return _extract_summary(cleaned_lines), _join_cleaned_lines(cleaned_lines)
+
+
+def parse_htm_bytes(raw_bytes, encoding="utf-8", final=True):
+    """
+    Returns the summary of an undecoded .htm body, or of its first complete lines.
+
+    Meant to run in a process pool: bytes pickle with a single copy, and decoding happens
+    in the worker process along with the parsing. Lines are cleaned lazily and only up
+    to the end of the summary section.
+
+    Returns:
+        tuple: (summary, complete), where `complete` is False if `raw_bytes` is only the
+            start of the page (`final` False) and the summary may continue past it.
+    """
+    text = raw_bytes.decode(encoding or "utf-8", errors="replace")
+    cleaned_lines = (
+        line for line in map(_clean_line, _iter_pre_lines([text], final)) if line
+    )
+    summary, ended = _summary_section(cleaned_lines)
+    if ended or final:
+        return summary, True
+    start = _PRE_START_RE.search(text)
+    return summary, bool(start and _PRE_END_RE.search(text, start.end()))
+
+
+def _stream_summary_in_pool(response, parse_pool, chunk_size=SUMMARY_CHUNK_SIZE):
+    """
+    `_stream_summary` with the parsing done in `parse_pool`.
+
+    The body is read as raw bytes until a line ending in a label follows `SUMMARY:`, or
+    the block ends, and the complete lines read so far go to the pool. If the summary
+    turns out to continue, reading resumes and a start at least twice as long is sent
+    next, so the result always matches parsing the whole page.
+    """
+    encoding = response.encoding or "utf-8"
+    body = bytearray()
+    section_from = None  # where to look for the end of the summary section
+    next_cut = 0
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        scan_from = max(len(body) - 16, 0)  # a marker may straddle two chunks
+        body += chunk
+        if section_from is None:
+            if match := _SUMMARY_START_BYTES_RE.search(body, scan_from):
+                section_from = match.end()
+            elif _PRE_END_BYTES_RE.search(body, scan_from):
+                section_from = scan_from
+            else:
+                continue
+            scan_from = section_from
+        if len(body) < next_cut or not _SECTION_END_BYTES_RE.search(
+            body, max(scan_from, section_from)
+        ):
+            continue
+
+        cut = body.rfind(b"\n") + 1
+        summary, complete = parse_pool.submit(
+            parse_htm_bytes, bytes(body[:cut]), encoding, False
+        ).result()
+        if complete:
+            return summary
+        next_cut = 2 * cut
+    return parse_pool.submit(parse_htm_bytes, bytes(body), encoding).result()[0]
+
+
+def download_and_parse_htm(
+    file_url, return_summary_only=False, return_raw_htm=False, session=None
+):
     """
     Downloads an .htm file, extracts meaningful content, and optionally returns the raw HTML or the summary section.
 
@@ -58,13 +709,24 @@ def download_and_parse_htm(file_url, return_summary_only=False, return_raw_htm=F
         file_url (str): URL of the .htm file to download.
         return_summary_only (bool): If True, return only the summary section. Otherwise, return the full cleaned content.
         return_raw_htm (bool): If True, return the raw HTML content without any processing.
+        session (requests.Session, optional): Session object to use for the download.
+
+    In summary-only mode the body is streamed and the connection is closed as soon as the
+    summary section ends, so the rest of a large rule is never downloaded.
 
     Returns:
         str: Raw HTML, cleaned and formatted text content, or the summary section from the HTML document.
     """
     try:
+        if return_summary_only and not return_raw_htm:
+            with (session or _get_session(streaming=True)).get(
+                file_url, stream=True
+            ) as response:
+                response.raise_for_status()
+                return _stream_summary(response)
+
         # Step 1: Download the HTML content
-        response = requests.get(file_url)
+        response = (session or _get_session()).get(file_url)
         response.raise_for_status()
         raw_html = response.text  # Raw HTML content
 
@@ -72,71 +734,14 @@ def download_and_parse_htm(file_url, return_summary_only=False, return_raw_htm=F
         if return_raw_htm:
             return raw_html
 
-        soup = BeautifulSoup(raw_html, "html.parser")
-
-        # Step 2: Extract the main <PRE> tag content
-        pre_tag = soup.find("pre")
-        if not pre_tag:
-            raise ValueError("No <PRE> tag found in the document.")
-        raw_text = pre_tag.get_text(separator="\n")
-
-        # Step 3: Define patterns to remove non-essential content
-        removable_patterns = [
-            r"^\[\s*Federal Register.*?\]\s*$",  # Federal Register header
-            r"^\[\s*DOCID:.*?\]\s*$",  # DOCID line
-            r"^\s*\[Page.*?\]\s*$",  # Page numbers
-            r"^BILLING CODE.*?$",  # Billing code
-            r"From the Federal Register Online.*?$",  # Source line
-            r"^\[FR Doc.*?\]\s*$",  # FR Doc line
-            r"\s*_{3,}\s*$",  # Separator lines
-            r"^\s+$",  # Empty lines
-        ]
-
-        # Step 4: Clean the text line by line
-        cleaned_lines = []
-        for line in raw_text.split("\n"):
-            # Skip lines matching removable patterns
-            if any(re.match(pattern, line) for pattern in removable_patterns):
-                continue
-
-            # Clean up excessive whitespace
-            line = re.sub(r"\s+", " ", line).strip()
-
-            if line:  # Only keep non-empty lines
-                cleaned_lines.append(line)
-
-        # Step 5: Extract the summary if requested
-        if return_summary_only:
-            summary_lines = []
-            in_summary = False
-            for line in cleaned_lines:
-                if line.startswith("SUMMARY:"):
-                    in_summary = True
-                    summary_lines.append(line.replace("SUMMARY:", "").strip())
-                elif in_summary:
-                    if not line or line.endswith(":"):  # Stop at a new section
-                        break
-                    summary_lines.append(line)
-
-            return (
-                " ".join(summary_lines).strip()
-                if summary_lines
-                else "Summary not found."
-            )
+        # Step 2: Extract and clean the <PRE> content
+        cleaned_lines = _clean_htm_lines(raw_html)
 
-        # Step 6: Join lines and normalize spacing for full content
-        cleaned_text = "\n".join(cleaned_lines)
-        cleaned_text = re.sub(
-            r"\n{3,}", "\n\n", cleaned_text
-        )  # Limit consecutive newlines
-        cleaned_text = re.sub(
-            r"(\w+:)\s+", r"\1 ", cleaned_text
-        )  # Normalize label formatting
-
-        return cleaned_text.strip()
+        # Step 3: Join lines and normalize spacing for full content
+        return _join_cleaned_lines(cleaned_lines)
 
     except Exception as e:
-        raise RuntimeError(f"Failed to process {file_url}: {e}")
+        raise RuntimeError(f"Failed to process {file_url}: {e}") from e
 
 
 def fetch_document(api_key, link):
@@ -155,7 +760,7 @@ def fetch_document(api_key, link):
     """
     try:
         # Make the API request
-        res = requests.get(f"{link}?api_key={api_key}")
+        res = _get_session().get(f"{link}?api_key={api_key}")
         res.raise_for_status()
 
         # Parse the response JSON
@@ -202,7 +807,7 @@ def fetch_metadata(api_key, link, session=None):
         ValueError: If the response is missing expected fields.
         requests.RequestException: If the API request fails.
     """
-    session = session or requests.Session()
+    session = session or _get_session()
     response = session.get(f"{link}?api_key={api_key}")
     response.raise_for_status()
     data = response.json()
@@ -247,56 +852,112 @@ def get_pdf_file_url(metadata):
     return pdf_file
 
 
-def fetch_doc_summaries(api_key, docs, doc_type="Rule", batch_size=16):
-    """
-    Fetches document summaries in parallel using a thread-safe cached session.
+def summarize_doc(
+    api_key, doc, doc_type="Rule", session=None, store=None, parse_pool=None
+):
     """
-    # Create a thread-safe cache
-    backend = SQLiteCache("http_cache", check_same_thread=False)
-    session = requests_cache.CachedSession(
-        cache_name="http_cache", backend=backend, expire_after=3600 * 24
-    )
+    Attaches the summary of one listed document to it, in place.
 
-    def process_doc(doc):
-        attr = doc.get("attributes")
-        link = doc.get("links", {}).get("self")
-        if attr and link:
-            document_type = attr.get("documentType")
-            if doc_type == "All" or document_type in doc_type:
-                try:
-                    metadata = fetch_metadata(api_key, link, session=session)
-                    html_url = get_html_file_url(metadata)
-
-                    if not html_url:
-                        pdf_url = get_pdf_file_url(metadata)
-                        if not pdf_url:
-                            raise ValueError(
-                                "No HTML or PDF file URL found in the document metadata."
-                            )
+    Documents whose type does not match `doc_type` are returned untouched. Failures are
+    recorded under the document's "error" key instead of being raised, and those that
+    will recur until the document changes (see `is_permanent_failure`) also set
+    "errorPermanent".
+
+    Only the start of the page is streamed, up to the end of the summary section. By
+    default it is parsed in this thread; with a `parse_pool`, in the pool instead.
+
+    Args:
+        api_key (str): API key for the Regulations.gov API.
+        doc (Document): A document from an agency listing.
+        doc_type (str or iterable): Document types to summarize, or "All".
+        session (requests.Session, optional): Session object to use for the metadata request.
+        store (ParsedDocumentStore, optional): Parsed-output store consulted before
+            downloading, and updated afterwards.
+        parse_pool (concurrent.futures.Executor, optional): Pool to run `parse_htm_bytes` in,
+            typically a `ProcessPoolExecutor`.
+
+    Returns:
+        Document: The same document.
+    """
+    attr = doc.get("attributes")
+    link = doc.get("links", {}).get("self")
+    if not (attr and link):
+        return doc
+    if doc_type != "All" and attr.get("documentType") not in doc_type:
+        return doc
 
-                    summary = download_and_parse_htm(
-                        html_url, session=session, return_summary_only=True
-                    )
-                    doc["summary"] = summary
-                except Exception as e:
-                    doc["error"] = str(e)
+    doc_id = doc.get("id")
+    last_modified = attr.get("lastModifiedDate")
+    if store is not None and (stored := store.get(doc_id, last_modified)) is not None:
+        doc["summary"] = stored
         return doc
 
+    try:
+        metadata = fetch_metadata(api_key, link, session=session)
+        metadata = metadata.get("data", {}).get("attributes", metadata)
+        html_url = get_html_file_url(metadata)
+
+        if not html_url:
+            pdf_url = get_pdf_file_url(metadata)
+            if not pdf_url:
+                raise PermanentSummaryError(
+                    "No HTML or PDF file URL found in the document metadata."
+                )
+            raise PermanentSummaryError(
+                "Only a PDF is available; summaries require an HTML file."
+            )
+
+        if parse_pool is not None:
+            # Stream the page as bytes and parse in the pool, up to the summary's end
+            with _get_session(streaming=True).get(html_url, stream=True) as response:
+                response.raise_for_status()
+                summary = _stream_summary_in_pool(response, parse_pool)
+        else:
+            # Stream the page and stop reading once the summary section ends
+            summary = download_and_parse_htm(html_url, return_summary_only=True)
+        if store is not None:
+            store.put(doc_id, last_modified, summary)
+        doc["summary"] = summary
+    except Exception as e:
+        doc["error"] = str(e)
+        if is_permanent_failure(e):
+            doc["errorPermanent"] = True
+    return doc
+
+
+def fetch_doc_summaries(
+    api_key,
+    docs,
+    doc_type="Rule",
+    max_workers=DEFAULT_SUMMARY_WORKERS,
+    store=None,
+    parse_pool=None,
+):
+    """
+    Fetches document summaries in parallel using the shared HTTP cache.
+
+    Workers pick up the next document as soon as they finish one, so a slow document
+    only occupies its own worker. Documents are returned in their original order.
+
+    When a `store` is given (see `src.corpus.ParsedDocumentStore`), documents whose id and
+    `lastModifiedDate` were parsed before are served from it without any network or parsing,
+    and newly parsed documents are written back to it. See `summarize_doc` for `parse_pool`.
+    """
+    session = _get_session()
+
     # Ensure doc_type is an iterable (except for "All")
     if doc_type != "All" and not isinstance(doc_type, Iterable):
         doc_type = [doc_type]
 
-    # Process documents in parallel using ThreadPoolExecutor
     processed_docs = []
     n = len(docs)
-    with ThreadPoolExecutor() as executor:
-        for i in range(0, n, batch_size):
-            batch = docs[i : i + batch_size]
-            processed_batch = list(executor.map(process_doc, batch))
-            processed_docs.extend(processed_batch)
-            print(
-                f"Processed {min(i+batch_size, n)}/{n} documents", end="\r", flush=True
-            )
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for doc in executor.map(
+            lambda doc: summarize_doc(api_key, doc, doc_type, session, store, parse_pool),
+            docs,
+        ):
+            processed_docs.append(doc)
+            print(f"Processed {len(processed_docs)}/{n} documents", end="\r", flush=True)
 
     return processed_docs
 
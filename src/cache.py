@@ -0,0 +1,333 @@
+import json
+import zlib
+import time
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from redis.exceptions import LockError
+
+# Stores one compressed value and evicts, in write order, entries past the TTL and then
+# the oldest ones until the namespace fits in its byte budget. Returns the evicted keys
+# so the client can delete their values.
+_PUT_SCRIPT = """
+local index, sizes, total_key = KEYS[1], KEYS[2], KEYS[3]
+local key, size, now = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3])
+local ttl, max_bytes = tonumber(ARGV[4]), tonumber(ARGV[5])
+redis.call('SET', KEYS[4], ARGV[6], 'EX', ttl)
+local old = tonumber(redis.call('HGET', sizes, key)) or 0
+redis.call('HSET', sizes, key, size)
+redis.call('ZADD', index, now, key)
+local total = redis.call('INCRBY', total_key, size - old)
+local evicted = {}
+local function evict(name)
+    total = total - (tonumber(redis.call('HGET', sizes, name)) or 0)
+    redis.call('ZREM', index, name)
+    redis.call('HDEL', sizes, name)
+    table.insert(evicted, name)
+end
+for _, name in ipairs(redis.call('ZRANGEBYSCORE', index, '-inf', '(' .. (now - ttl))) do
+    evict(name)
+end
+while total > max_bytes do
+    local oldest = redis.call('ZRANGE', index, 0, 0)[1]
+    if not oldest or oldest == key then break end
+    evict(oldest)
+end
+redis.call('SET', total_key, total)
+return evicted
+"""
+
+COUNTER_FLUSH_INTERVAL = 5.0  # seconds between writes of buffered hit/miss counters
+
+
+class ResultCache:
+    """
+    Two-level cache for JSON-serializable function results.
+
+    An in-process LRU answers repeat lookups within a worker; behind it, a Redis layer
+    shares results across workers with a TTL. Both layers are bounded by the bytes of
+    the zlib-compressed values they hold: `local_max_bytes` for the LRU and `max_bytes`
+    for Redis, where a Lua script keeps a running total and evicts the oldest writes.
+    Values larger than `max_value_bytes` are not stored.
+
+    Hit and miss counters are buffered in the worker and added to Redis at most every
+    `COUNTER_FLUSH_INTERVAL` seconds, so `stats()` reports totals for all workers
+    without a Redis write per lookup.
+
+    Cached values are returned as fresh copies, so callers may mutate them.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        namespace: str,
+        ttl: int = 3600 * 24,
+        local_max_bytes: int = 32 * 1024 * 1024,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_value_bytes: int = 2 * 1024 * 1024,
+    ) -> None:
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_max_bytes = local_max_bytes
+        self.max_bytes = max_bytes
+        self.max_value_bytes = max_value_bytes
+        self._local = OrderedDict()  # key -> (expires_at, payload)
+        self._local_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._flushed_at = time.monotonic()
+        self._put_script = redis_client.register_script(_PUT_SCRIPT)
+
+    def _key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+            if time.monotonic() - self._flushed_at < COUNTER_FLUSH_INTERVAL:
+                return
+        self._flush_counters()
+
+    def _flush_counters(self) -> None:
+        with self._lock:
+            counters, self._counters = self._counters, Counter()
+            self._flushed_at = time.monotonic()
+        if not counters:
+            return
+        pipe = self.redis_client.pipeline()
+        for counter, value in counters.items():
+            pipe.hincrby(f"cache_stats:{self.namespace}", counter, value)
+        pipe.execute()
+
+    def _get_local(self, key: str):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at < time.monotonic():
+                del self._local[key]
+                self._local_bytes -= len(payload)
+                return None
+            self._local.move_to_end(key)
+            return payload
+
+    def _put_local(self, key: str, payload: bytes, ttl: float) -> None:
+        if len(payload) > self.local_max_bytes:
+            return
+        with self._lock:
+            if (old := self._local.pop(key, None)) is not None:
+                self._local_bytes -= len(old[1])
+            self._local[key] = (time.monotonic() + ttl, payload)
+            self._local_bytes += len(payload)
+            while self._local_bytes > self.local_max_bytes:
+                self._local_bytes -= len(self._local.popitem(last=False)[1][1])
+
+    def _put_redis(self, key: str, payload: bytes) -> None:
+        evicted = self._put_script(
+            keys=[
+                f"cache_index:{self.namespace}",
+                f"cache_sizes:{self.namespace}",
+                f"cache_bytes:{self.namespace}",
+                self._key(key),
+            ],
+            args=[key, len(payload), time.time(), self.ttl, self.max_bytes, payload],
+        )
+        if evicted:
+            self.redis_client.delete(*(self._key(k.decode()) for k in evicted))
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value for `key`, calling `compute` and caching its result on a miss.
+
+        Exceptions from `compute` propagate and nothing is cached.
+        """
+        if (payload := self._get_local(key)) is not None:
+            self._count("local_hits")
+            return json.loads(zlib.decompress(payload))
+
+        pipe = self.redis_client.pipeline()
+        pipe.get(self._key(key))
+        pipe.ttl(self._key(key))
+        payload, ttl = pipe.execute()
+        if payload is not None:
+            self._count("redis_hits")
+            self._put_local(key, payload, max(ttl, 1))
+            return json.loads(zlib.decompress(payload))
+
+        self._count("misses")
+        value = compute()
+        payload = zlib.compress(json.dumps(value).encode())
+        if len(payload) <= self.max_value_bytes:
+            self._put_redis(key, payload)
+            self._put_local(key, payload, self.ttl)
+        return value
+
+    def stats(self) -> dict:
+        """
+        Returns hit and miss totals across all workers, plus the combined hit rate and
+        the entries and compressed bytes held in Redis and in this worker.
+        """
+        self._flush_counters()
+        pipe = self.redis_client.pipeline()
+        pipe.hgetall(f"cache_stats:{self.namespace}")
+        pipe.zcard(f"cache_index:{self.namespace}")
+        pipe.get(f"cache_bytes:{self.namespace}")
+        counters, entries, total_bytes = pipe.execute()
+        stats = {
+            name: int(counters.get(name.encode(), 0))
+            for name in ("local_hits", "redis_hits", "misses")
+        }
+        lookups = sum(stats.values())
+        stats["hit_rate"] = (
+            (stats["local_hits"] + stats["redis_hits"]) / lookups if lookups else 0.0
+        )
+        stats["entries"] = entries
+        stats["bytes"] = int(total_bytes or 0)
+        with self._lock:
+            stats["local_entries"] = len(self._local)
+            stats["local_bytes"] = self._local_bytes
+        return stats
+
+
+class SWRCache:
+    """
+    Stale-while-revalidate cache in Redis with request coalescing.
+
+    Entries younger than `fresh_ttl` are served as-is. Older entries, up to `stale_ttl`,
+    are served immediately while a single background refresh (one per key across all
+    workers) fetches a new value. On a miss, concurrent callers for the same key share
+    one upstream call: within a worker they wait on the same future, and across workers
+    the callers that lose the Redis lock wait briefly for the winner's result.
+
+    The lock holds a per-caller token and is only released by its owner, so a caller that
+    gave up waiting, or one whose lock expired mid-fetch, never frees someone else's.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        namespace: str,
+        fresh_ttl: int = 600,
+        stale_ttl: int = 3600,
+        lock_ttl: int = 30,
+        wait_timeout: float = 10.0,
+        refresh_workers: int = 2,
+    ) -> None:
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(
+            max_workers=refresh_workers, thread_name_prefix=f"swr-{namespace}"
+        )
+
+    def _key(self, key: str) -> str:
+        return f"swr:{self.namespace}:{key}"
+
+    def _lock_key(self, key: str) -> str:
+        return f"swr_lock:{self.namespace}:{key}"
+
+    def _try_lock(self, key: str):
+        """
+        Returns the fetch lock for `key` if this caller got it, otherwise None.
+        """
+        # Not thread-local: a stale entry's lock is released by the refresher thread
+        lock = self.redis_client.lock(
+            self._lock_key(key), timeout=self.lock_ttl, thread_local=False
+        )
+        return lock if lock.acquire(blocking=False) else None
+
+    def _count(self, counter: str) -> None:
+        self.redis_client.hincrby(f"cache_stats:{self.namespace}", counter, 1)
+
+    def _read(self, key: str):
+        raw = self.redis_client.get(self._key(key))
+        return json.loads(raw) if raw else None
+
+    def _fetch_and_store(self, key: str, fetch: Callable[[], Any], lock=None) -> Any:
+        try:
+            value = fetch()
+            entry = {"fetched_at": time.time(), "value": value}
+            self.redis_client.set(self._key(key), json.dumps(entry), ex=self.stale_ttl)
+            return value
+        finally:
+            if lock is not None:
+                try:
+                    lock.release()
+                except LockError:
+                    pass  # expired during the fetch and possibly taken by another caller
+
+    def _refresh(self, key: str, fetch: Callable[[], Any], lock) -> None:
+        try:
+            self._fetch_and_store(key, fetch, lock)
+            self._count("refreshes")
+        except Exception as e:
+            print(f"Background refresh of {self.namespace}:{key} failed: {e}")
+
+    def _load(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """
+        Fetches a missing entry, letting only one worker call upstream at a time.
+        """
+        if (lock := self._try_lock(key)) is not None:
+            return self._fetch_and_store(key, fetch, lock)
+
+        # Another worker is fetching the same key; wait for its result
+        self._count("coalesced")
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            if (entry := self._read(key)) is not None:
+                return entry["value"]
+        # The lock is someone else's, so this fetch does not touch it
+        return self._fetch_and_store(key, fetch)
+
+    def get(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """
+        Returns the value for `key`, fetching, refreshing or waiting as described above.
+        """
+        entry = self._read(key)
+        if entry is not None:
+            if time.time() - entry["fetched_at"] < self.fresh_ttl:
+                self._count("fresh_hits")
+            else:
+                self._count("stale_hits")
+                if (lock := self._try_lock(key)) is not None:
+                    self._refresher.submit(self._refresh, key, fetch, lock)
+            return entry["value"]
+
+        self._count("misses")
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+
+        if not owner:
+            self._count("coalesced")
+            return future.result()
+
+        try:
+            value = self._load(key, fetch)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        counters = self.redis_client.hgetall(f"cache_stats:{self.namespace}")
+        return {
+            name: int(counters.get(name.encode(), 0))
+            for name in ("fresh_hits", "stale_hits", "misses", "coalesced", "refreshes")
+        }
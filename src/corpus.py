@@ -0,0 +1,331 @@
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from src.agencies import fetch_doc_summaries
+from src.documents import Document, as_document
+from src.pipeline import ingest_agency
+
+DEFAULT_STORE_PATH = "corpus_store.sqlite"
+
+# Regulations.gov filters lastModifiedDate in US Eastern time while the documents report
+# UTC, so each sync re-lists a small overlap window and drops what it has already seen.
+SYNC_OVERLAP = timedelta(days=1)
+
+# Transient summary failures are retried on later syncs, waiting twice as long after
+# each failed attempt, until the limit; a new version of the document starts over.
+SUMMARY_RETRY_LIMIT = 6
+SUMMARY_RETRY_BACKOFF = 3600  # seconds before the first retry
+
+
+class CorpusStore:
+    """
+    Local per-agency copy of the Regulations.gov document listing, including summaries.
+
+    Each agency keeps a high-water mark (the newest `lastModifiedDate` seen) so that
+    later syncs only need to ask the API for documents changed since then.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    agency TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    posted_date TEXT,
+                    last_modified TEXT,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (agency, id)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    agency TEXT PRIMARY KEY,
+                    high_water_mark TEXT,
+                    synced_at TEXT
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS summary_retries (
+                    agency TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    last_modified TEXT,
+                    attempts INTEGER NOT NULL,
+                    retry_after REAL NOT NULL,
+                    PRIMARY KEY (agency, id)
+                )
+                """
+            )
+
+    def high_water_mark(self, agency: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT high_water_mark FROM sync_state WHERE agency = ?", (agency,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_high_water_mark(self, agency: str, mark: Optional[str]) -> None:
+        synced_at = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO sync_state (agency, high_water_mark, synced_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT (agency) DO UPDATE SET
+                    high_water_mark = excluded.high_water_mark,
+                    synced_at = excluded.synced_at
+                """,
+                (agency, mark, synced_at),
+            )
+
+    def upsert(self, agency: str, docs: List[Document]) -> None:
+        """
+        Inserts new documents and replaces changed ones, withdrawn documents included.
+        """
+        rows = [
+            (
+                agency,
+                doc.id,
+                doc.posted_date,
+                doc.last_modified_date,
+                json.dumps(doc.to_dict()),
+            )
+            for doc in map(as_document, docs)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO documents (agency, id, posted_date, last_modified, data)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (agency, id) DO UPDATE SET
+                    posted_date = excluded.posted_date,
+                    last_modified = excluded.last_modified,
+                    data = excluded.data
+                """,
+                rows,
+            )
+
+    def documents(self, agency: str) -> List[Document]:
+        """
+        Returns the stored documents for an agency, most recently posted first.
+
+        Rows are decoded one at a time into compact `Document` records, so neither the
+        stored JSON nor API-shaped dicts for the whole agency are held at once.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT data FROM documents WHERE agency = ?
+                ORDER BY posted_date DESC, id
+                """,
+                (agency,),
+            )
+            return [Document.from_dict(json.loads(data)) for (data,) in rows]
+
+    def failed_documents(
+        self, agency: str, now: Optional[float] = None
+    ) -> List[Document]:
+        """
+        Returns the stored documents whose summary failed transiently and is due a retry.
+
+        Permanent failures are left out, and so are documents still backing off or past
+        `SUMMARY_RETRY_LIMIT` attempts (see `record_summary_attempts`).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT d.data FROM documents d
+                LEFT JOIN summary_retries r
+                    ON r.agency = d.agency AND r.id = d.id
+                    AND r.last_modified IS d.last_modified
+                WHERE d.agency = ?
+                    AND json_extract(d.data, '$.error') IS NOT NULL
+                    AND json_extract(d.data, '$.errorPermanent') IS NULL
+                    AND (r.id IS NULL OR (r.attempts < ? AND r.retry_after <= ?))
+                """,
+                (agency, SUMMARY_RETRY_LIMIT, time.time() if now is None else now),
+            )
+            return [Document.from_dict(json.loads(data)) for (data,) in rows]
+
+    def record_summary_attempts(
+        self, agency: str, docs: List[Document], now: Optional[float] = None
+    ) -> None:
+        """
+        Counts transient summary failures and schedules their next retry.
+
+        The retry after the n-th failed attempt of a version waits
+        `SUMMARY_RETRY_BACKOFF * 2 ** (n - 1)` seconds. Successes and permanent failures
+        clear the count.
+        """
+        now = time.time() if now is None else now
+        with self._lock, self._conn:
+            for doc in map(as_document, docs):
+                if doc.error is None or doc.error_permanent:
+                    self._conn.execute(
+                        "DELETE FROM summary_retries WHERE agency = ? AND id = ?",
+                        (agency, doc.id),
+                    )
+                    continue
+                row = self._conn.execute(
+                    """
+                    SELECT attempts FROM summary_retries
+                    WHERE agency = ? AND id = ? AND last_modified IS ?
+                    """,
+                    (agency, doc.id, doc.last_modified_date),
+                ).fetchone()
+                attempts = (row[0] if row else 0) + 1
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO summary_retries
+                        (agency, id, last_modified, attempts, retry_after)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (
+                        agency,
+                        doc.id,
+                        doc.last_modified_date,
+                        attempts,
+                        now + SUMMARY_RETRY_BACKOFF * 2 ** (attempts - 1),
+                    ),
+                )
+
+
+class ParsedDocumentStore:
+    """
+    Durable store of extracted summaries keyed by document id and `lastModifiedDate`.
+
+    Holding the summary lets prompt rebuilds skip both the download and the HTML parsing
+    for documents that have not changed.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS parsed_documents (
+                    id TEXT NOT NULL,
+                    last_modified TEXT NOT NULL,
+                    summary TEXT,
+                    PRIMARY KEY (id, last_modified)
+                )
+                """
+            )
+
+    def get(self, doc_id: str, last_modified: Optional[str]) -> Optional[str]:
+        """
+        Returns the summary for this version of the document, or None on a miss.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM parsed_documents WHERE id = ? AND last_modified = ?",
+                (doc_id, last_modified or ""),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, doc_id: str, last_modified: Optional[str], summary: str) -> None:
+        """
+        Stores the summary for this version and drops any older versions of the document.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM parsed_documents WHERE id = ? AND last_modified != ?",
+                (doc_id, last_modified or ""),
+            )
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO parsed_documents (id, last_modified, summary)
+                VALUES (?, ?, ?)
+                """,
+                (doc_id, last_modified or "", summary),
+            )
+
+
+def _api_timestamp(mark: str) -> str:
+    """
+    Converts a stored ISO-8601 high-water mark into the API's filter format, minus the overlap.
+    """
+    since = datetime.fromisoformat(mark.replace("Z", "+00:00")) - SYNC_OVERLAP
+    return since.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def sync_agency(
+    api_key: str,
+    agency: str,
+    store: Optional[CorpusStore] = None,
+    parsed_store: Optional[ParsedDocumentStore] = None,
+) -> List[Document]:
+    """
+    Brings the local corpus for an agency up to date and returns all of its documents.
+
+    The first sync lists the whole agency. Later syncs only list documents whose
+    `lastModifiedDate` is past the stored high-water mark, and only those documents
+    are re-summarized before being merged into the store. Listing and summarizing
+    overlap (see `src.pipeline.ingest_agency`).
+
+    Summary failures are stored with the document's "error" and the high-water mark
+    still moves past them. Transient ones (rate limits, timeouts, server errors) are
+    retried by later syncs with a growing backoff, up to `SUMMARY_RETRY_LIMIT` attempts
+    per version; permanent ones, such as a document with only a PDF, are not.
+
+    Args:
+        api_key (str): API key for the Regulations.gov API.
+        agency (str): The agency ID to sync.
+        store (CorpusStore, optional): Store to sync into. Defaults to the on-disk store.
+        parsed_store (ParsedDocumentStore, optional): Parsed-output store consulted before
+            downloading a changed document. Defaults to the on-disk store.
+
+    Returns:
+        list: Every stored document for the agency, with summaries attached.
+    """
+    store = store or CorpusStore()
+    parsed_store = parsed_store or ParsedDocumentStore()
+    mark = store.high_water_mark(agency)
+
+    changed = ingest_agency(
+        api_key,
+        agency,
+        last_modified_since=_api_timestamp(mark) if mark else None,
+        accept=lambda doc: mark is None or (doc.last_modified_date or "") > mark,
+        store=parsed_store,
+    )
+
+    if changed:
+        print(f"Synced {len(changed)} changed documents for {agency}")
+        store.upsert(agency, changed)
+        mark = max(
+            [mark or ""]
+            + [doc.last_modified_date or "" for doc in changed]
+        )
+        store.set_high_water_mark(agency, mark or None)
+        store.record_summary_attempts(agency, changed)
+
+    changed_ids = {doc.id for doc in changed}
+    failed = [
+        doc for doc in store.failed_documents(agency) if doc.id not in changed_ids
+    ]
+    if failed:
+        for doc in failed:
+            doc.error = None
+        retried = fetch_doc_summaries(api_key, failed, store=parsed_store)
+        store.upsert(agency, retried)
+        store.record_summary_attempts(agency, retried)
+        still_failed = sum(doc.error is not None for doc in retried)
+        print()  # ends the progress line
+        print(
+            f"Retried {len(retried)} failed summaries for {agency} "
+            f"({still_failed} still failing)"
+        )
+
+    return store.documents(agency)
@@ -0,0 +1,166 @@
+import sys
+from typing import Optional
+
+_LINK_PREFIX = "https://api.regulations.gov/v4/documents/"
+
+# Attribute name in the API -> slot, for the fields the prompt, retrieval and sync use
+_ATTRIBUTES = {
+    "title": "title",
+    "documentType": "document_type",
+    "postedDate": "posted_date",
+    "lastModifiedDate": "last_modified_date",
+    "withdrawn": "withdrawn",
+    "docketId": "docket_id",
+    "agencyId": "agency_id",
+}
+# Values shared by many documents, stored once per process
+_INTERNED = {"documentType", "postedDate", "docketId", "agencyId"}
+# Top-level keys of the API shape (plus summary results) -> slot
+_ITEMS = {
+    "id": "id",
+    "summary": "summary",
+    "error": "error",
+    "errorPermanent": "error_permanent",
+}
+_ASSIGNABLE = {"summary", "error", "errorPermanent"}
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Document:
+    """
+    Compact record of a listed Regulations.gov document.
+
+    Only the fields used by the prompt template, retrieval and the corpus sync are kept,
+    in slots rather than the API's nested dicts, and repeated values such as the document
+    type, agency and docket are interned. The self link is rebuilt from the id when it
+    has the usual form.
+
+    For existing code the record also reads like the API object it came from:
+    `doc["attributes"]`, `doc.get("links", {})["self"]`, `"summary" in doc` and
+    `doc["summary"] = ...` work as they do on the dict, and so do the template's
+    `doc.attributes.title` lookups. A field that is None counts as absent.
+
+    A failed summary attempt leaves its message in `error`; `error_permanent` marks
+    failures that will recur until the document changes (see `src.corpus.sync_agency`).
+    """
+
+    __slots__ = (
+        "id", "_link", "summary", "error", "error_permanent", *_ATTRIBUTES.values()
+    )
+
+    def __init__(
+        self,
+        id: Optional[str],
+        title: Optional[str] = None,
+        document_type: Optional[str] = None,
+        posted_date: Optional[str] = None,
+        last_modified_date: Optional[str] = None,
+        withdrawn: Optional[bool] = None,
+        docket_id: Optional[str] = None,
+        agency_id: Optional[str] = None,
+        link: Optional[str] = None,
+        summary: Optional[str] = None,
+        error: Optional[str] = None,
+        error_permanent: Optional[bool] = None,
+    ) -> None:
+        self.id = id
+        self.title = title
+        self.document_type = _intern(document_type)
+        self.posted_date = _intern(posted_date)
+        self.last_modified_date = last_modified_date
+        self.withdrawn = withdrawn
+        self.docket_id = _intern(docket_id)
+        self.agency_id = _intern(agency_id)
+        self._link = None if link == f"{_LINK_PREFIX}{id}" else link
+        self.summary = summary
+        self.error = error
+        self.error_permanent = error_permanent
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Document":
+        """
+        Builds a record from an API listing entry (or a `to_dict` result).
+        """
+        attr = data.get("attributes") or {}
+        doc = cls(data.get("id"), link=(data.get("links") or {}).get("self"))
+        for name, slot in _ATTRIBUTES.items():
+            value = attr.get(name)
+            setattr(doc, slot, _intern(value) if name in _INTERNED else value)
+        doc.summary = data.get("summary")
+        doc.error = data.get("error")
+        doc.error_permanent = data.get("errorPermanent")
+        return doc
+
+    @property
+    def link(self) -> Optional[str]:
+        if self._link is None and self.id is not None:
+            return f"{_LINK_PREFIX}{self.id}"
+        return self._link
+
+    @property
+    def attributes(self) -> dict:
+        attributes = {}
+        for name, slot in _ATTRIBUTES.items():
+            value = getattr(self, slot)
+            if value is not None:
+                attributes[name] = value
+        return attributes
+
+    @property
+    def links(self) -> dict:
+        link = self.link
+        return {"self": link} if link is not None else {}
+
+    def to_dict(self) -> dict:
+        """
+        Returns the record in the API's shape, e.g. for JSON storage.
+        """
+        data = {"id": self.id, "attributes": self.attributes, "links": self.links}
+        if self.summary is not None:
+            data["summary"] = self.summary
+        if self.error is not None:
+            data["error"] = self.error
+        if self.error_permanent is not None:
+            data["errorPermanent"] = self.error_permanent
+        return data
+
+    # Read-only mapping interface over the API shape, plus summary and error assignment
+
+    def __getitem__(self, key: str):
+        if key == "attributes":
+            return self.attributes
+        if key == "links":
+            return self.links
+        if key in _ITEMS:
+            value = getattr(self, _ITEMS[key])
+            if value is not None:
+                return value
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value) -> None:
+        if key not in _ASSIGNABLE:
+            raise KeyError(f"Document only accepts {sorted(_ASSIGNABLE)}, not {key!r}")
+        setattr(self, _ITEMS[key], value)
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self) -> str:
+        return f"Document({self.id!r}, {self.document_type!r}, {self.title!r})"
+
+
+def as_document(doc) -> Document:
+    return doc if isinstance(doc, Document) else Document.from_dict(doc)
@@ -0,0 +1,432 @@
+import struct
+import hashlib
+from typing import Iterable, List, Optional, Tuple
+
+import google.generativeai as genai
+
+# Record layout (all integers big-endian):
+#   version (1 byte) | role length (1 byte) | role | parts...
+#   part: kind (1 byte) | payload length (4 bytes) | payload
+# Inline parts carry the serialized `Part`. Reference parts point at a serialized `Part`
+# stored under its own key, so bulky tool payloads are written once:
+#   token estimate (4 bytes) | sha256 hex digest (64 bytes) | serialized stub `Part`
+# Function responses and files carry the stub `compact_history` would replay in an older
+# turn, so those blobs need not be read for such turns; other parts have no stub.
+HISTORY_FORMAT_VERSION = 1
+PART_INLINE = 0
+PART_REF = 1
+
+HISTORY_TTL = 600  # seconds; refreshed on every load and append
+BLOB_THRESHOLD = 4 * 1024  # serialized parts larger than this are stored by reference
+# Records kept per session; older ones could only ever show up in the condensed summary
+HISTORY_MAX_RECORDS = 200
+
+HISTORY_TOKEN_BUDGET = 32_000  # default replay budget for `compact_history`
+KEEP_RECENT_TURNS = 2  # turns that are always replayed verbatim
+FILE_PART_TOKENS = 2_580  # rough cost of an attached PDF (about ten pages)
+STUB_CHARS = 300  # characters of each question/answer kept in the summary of dropped turns
+SUMMARY_MAX_TURNS = 10  # dropped turns listed individually in the summary
+OMITTED_RESPONSE = {
+    "status": "omitted",
+    "result": "Result omitted to save space; call the function again if it is still needed.",
+    "error": None,
+}
+
+_PART_HEADER = struct.Struct(">BI")
+_REF_TOKENS = struct.Struct(">I")
+_DIGEST_LENGTH = 64
+
+
+def _history_key(session_id: str) -> str:
+    return f"history:{session_id}"
+
+
+def _blob_key(digest: str) -> str:
+    return f"history:blob:{digest}"
+
+
+def encode_content(content) -> Tuple[bytes, dict]:
+    """
+    Serializes one chat message into a history record.
+
+    Returns:
+        tuple: (record, blobs) where blobs maps digests to serialized parts stored by reference.
+    """
+    role = content.role.encode()
+    record = [bytes([HISTORY_FORMAT_VERSION, len(role)]), role]
+    blobs = {}
+    for part in content.parts:
+        payload = genai.protos.Part.serialize(part)
+        if len(payload) > BLOB_THRESHOLD:
+            digest = hashlib.sha256(payload).hexdigest()
+            blobs[digest] = payload
+            reference = _REF_TOKENS.pack(estimate_part_tokens(part)) + digest.encode()
+            if part.function_response or part.file_data:
+                reference += genai.protos.Part.serialize(_stub_part(part))
+            record.append(_PART_HEADER.pack(PART_REF, len(reference)))
+            record.append(reference)
+        else:
+            record.append(_PART_HEADER.pack(PART_INLINE, len(payload)))
+            record.append(payload)
+    return b"".join(record), blobs
+
+
+def _split_record(record: bytes) -> Tuple[str, List[Tuple[int, bytes]]]:
+    version, role_len = record[0], record[1]
+    if version != HISTORY_FORMAT_VERSION:
+        raise ValueError(f"Unsupported history record version {version}.")
+
+    offset = 2 + role_len
+    role = record[2:offset].decode()
+    parts = []
+    while offset < len(record):
+        kind, length = _PART_HEADER.unpack_from(record, offset)
+        offset += _PART_HEADER.size
+        parts.append((kind, record[offset : offset + length]))
+        offset += length
+    return role, parts
+
+
+def _split_reference(payload: bytes) -> Tuple[int, str, Optional[bytes]]:
+    """
+    Returns (token estimate, digest, serialized stub or None) of a reference part.
+    """
+    (tokens,) = _REF_TOKENS.unpack_from(payload)
+    digest_end = _REF_TOKENS.size + _DIGEST_LENGTH
+    stub = payload[digest_end:]
+    return tokens, payload[_REF_TOKENS.size : digest_end].decode(), stub or None
+
+
+def _stub_part(part):
+    """
+    Short stand-in for a function response or file, as replayed in an older turn.
+    """
+    if part.function_response:
+        return genai.protos.Part(
+            function_response=genai.protos.FunctionResponse(
+                name=part.function_response.name, response=OMITTED_RESPONSE
+            )
+        )
+    return genai.protos.Part(
+        text=f"[Attachment omitted to save space: {part.file_data.file_uri}]"
+    )
+
+
+class _LoadPlan:
+    """
+    History decoded with stubs in place of referenced blobs, and the blobs worth fetching.
+
+    Stubbed blobs are only needed for the turns `compact_history` replays verbatim: all
+    of them while the history fits in `token_budget` (using the estimates stored with
+    the references), and otherwise only the last `keep_recent_turns`. Older turns keep
+    their stubs, which is what `compact_history` would turn them into anyway.
+    """
+
+    def __init__(
+        self,
+        records: List[bytes],
+        token_budget: Optional[int] = None,
+        keep_recent_turns: int = KEEP_RECENT_TURNS,
+    ) -> None:
+        self.history = []
+        self._refs = {}  # digest -> [(message index, part index, has stub)]
+        tokens = 0
+        for record in records:
+            role, raw_parts = _split_record(record)
+            parts = []
+            for kind, payload in raw_parts:
+                if kind == PART_REF:
+                    part_tokens, digest, stub = _split_reference(payload)
+                    self._refs.setdefault(digest, []).append(
+                        (len(self.history), len(parts), stub is not None)
+                    )
+                    part = genai.protos.Part.deserialize(stub) if stub else genai.protos.Part()
+                    tokens += part_tokens
+                else:
+                    part = genai.protos.Part.deserialize(payload)
+                    tokens += estimate_part_tokens(part)
+                parts.append(part)
+            self.history.append(genai.protos.Content(role=role, parts=parts))
+
+        # A trimmed list may start mid-turn; replay from the first full turn
+        start = next(
+            (i for i, content in enumerate(self.history) if _starts_turn(content)),
+            len(self.history),
+        )
+        verbatim_from = start
+        if token_budget is not None and tokens > token_budget:
+            turn_starts = [
+                i for i in range(start, len(self.history)) if _starts_turn(self.history[i])
+            ]
+            if keep_recent_turns <= 0:
+                verbatim_from = len(self.history)
+            elif len(turn_starts) > keep_recent_turns:
+                verbatim_from = turn_starts[-keep_recent_turns]
+        self._start = start
+        self._verbatim_from = verbatim_from
+
+    def digests(self) -> List[str]:
+        """
+        Digests of the blobs to fetch: those in verbatim turns, and any without a stub.
+        """
+        return [
+            digest
+            for digest, uses in self._refs.items()
+            if any(
+                i >= self._start and (i >= self._verbatim_from or not has_stub)
+                for i, _, has_stub in uses
+            )
+        ]
+
+    def resolve(self, blobs: dict) -> list:
+        """
+        Puts the fetched blobs in place and returns the history to replay.
+
+        An expired blob falls back to its stub; without one (a bulky text part, say)
+        the history is unreadable.
+        """
+        for digest, uses in self._refs.items():
+            payload = blobs.get(digest)
+            for i, j, has_stub in uses:
+                if i < self._start:
+                    continue
+                if payload is not None and (i >= self._verbatim_from or not has_stub):
+                    self.history[i].parts[j] = genai.protos.Part.deserialize(payload)
+                elif not has_stub:
+                    raise ValueError("History references an expired payload.")
+        return self.history[self._start :]
+
+
+def _starts_turn(content) -> bool:
+    return content.role == "user" and any(p.text for p in content.parts)
+
+
+def decode_records(records: Iterable[bytes], blobs: dict) -> list:
+    """
+    Rebuilds chat messages from history records and the blobs they reference.
+    """
+    plan = _LoadPlan(list(records))
+    return plan.resolve(blobs)
+
+
+def _encode_messages(messages: list) -> Tuple[List[bytes], dict]:
+    records = []
+    blobs = {}
+    for content in messages:
+        record, content_blobs = encode_content(content)
+        records.append(record)
+        blobs.update(content_blobs)
+    return records, blobs
+
+
+def estimate_part_tokens(part) -> int:
+    """
+    Cheap token estimate for one message part (about four bytes per token).
+    """
+    if part.file_data:
+        return FILE_PART_TOKENS
+    if part.text:
+        return len(part.text) // 4 + 1
+    return len(genai.protos.Part.serialize(part)) // 4 + 1
+
+
+def estimate_history_tokens(history: list) -> int:
+    return sum(estimate_part_tokens(part) for content in history for part in content.parts)
+
+
+def _split_turns(history: list) -> List[list]:
+    """
+    Groups messages into turns, each starting at a user message with text in it.
+    """
+    turns = []
+    for content in history:
+        if _starts_turn(content) or not turns:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def _stub_bulky_parts(turn: list) -> list:
+    """
+    Replaces function results and attached files in a turn with short placeholders.
+    """
+    stubbed = []
+    for content in turn:
+        parts = [
+            _stub_part(part) if part.function_response or part.file_data else part
+            for part in content.parts
+        ]
+        stubbed.append(genai.protos.Content(role=content.role, parts=parts))
+    return stubbed
+
+
+def _summarize_turns(turns: List[list]) -> list:
+    """
+    Condenses dropped turns into one user/model exchange listing recent questions and answers.
+    """
+
+    def text_of(content):
+        text = " ".join(p.text for p in content.parts if p.text).strip()
+        return text if len(text) <= STUB_CHARS else text[:STUB_CHARS] + "..."
+
+    lines = ["Summary of earlier conversation (older turns were condensed):"]
+    if len(turns) > SUMMARY_MAX_TURNS:
+        lines.append(f"- ({len(turns) - SUMMARY_MAX_TURNS} earlier turns omitted)")
+    for turn in turns[-SUMMARY_MAX_TURNS:]:
+        answers = [text_of(c) for c in turn if c.role == "model" and text_of(c)]
+        lines.append(f"- User asked: {text_of(turn[0])}")
+        if answers:
+            lines.append(f"  Answer: {answers[-1]}")
+
+    return [
+        genai.protos.Content(role="user", parts=[genai.protos.Part(text="\n".join(lines))]),
+        genai.protos.Content(
+            role="model",
+            parts=[genai.protos.Part(text="Understood, I will keep that context in mind.")],
+        ),
+    ]
+
+
+def compact_history(
+    history: list,
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+    keep_recent_turns: int = KEEP_RECENT_TURNS,
+) -> list:
+    """
+    Shrinks a chat history to roughly `token_budget` tokens before it is replayed.
+
+    The most recent turns are kept verbatim. Older turns first lose their function results
+    and attachments (replaced by stubs the model can re-request); if that is not enough,
+    the oldest turns are folded into a bounded summary exchange until the history fits.
+
+    Args:
+        history (list): Chat history as `Content` messages.
+        token_budget (int): Target size of the replayed history, in estimated tokens.
+        keep_recent_turns (int): Number of trailing turns never compacted.
+
+    Returns:
+        list: The history to replay; `history` itself if it already fits.
+    """
+    if estimate_history_tokens(history) <= token_budget:
+        return history
+
+    turns = _split_turns(history)
+    split = max(len(turns) - keep_recent_turns, 0)
+    older = [_stub_bulky_parts(turn) for turn in turns[:split]]
+    recent = turns[split:]
+
+    older_tokens = [estimate_history_tokens(turn) for turn in older]
+    total = sum(older_tokens) + sum(estimate_history_tokens(turn) for turn in recent)
+
+    # Drop the oldest turns until the rest plus a (bounded) summary of them fits
+    dropped = 0
+    summary = []
+    while total > token_budget and dropped < len(older):
+        total -= older_tokens[dropped] + estimate_history_tokens(summary)
+        dropped += 1
+        summary = _summarize_turns(older[:dropped])
+        total += estimate_history_tokens(summary)
+
+    return summary + [content for turn in older[dropped:] + recent for content in turn]
+
+
+class HistoryStore:
+    """
+    Append-only chat history kept as a Redis list of compact message records.
+
+    Each turn appends only its new messages, and the list is trimmed to the last
+    `HISTORY_MAX_RECORDS`. Loading reads the list and refreshes its TTL in a single
+    pipelined round trip, then fetches only the blobs of the turns that will be replayed
+    verbatim, so per-turn Redis traffic does not grow with the conversation.
+    """
+
+    def __init__(self, redis_client, ttl: int = HISTORY_TTL) -> None:
+        self.redis_client = redis_client
+        self.ttl = ttl
+
+    def load(self, session_id: str, token_budget: Optional[int] = None) -> list:
+        """
+        Returns the session's chat history, or an empty list if it doesn't exist or has expired.
+
+        With a `token_budget`, a history over budget comes back with its bulky parts
+        stubbed outside the last `KEEP_RECENT_TURNS` turns, ready for `compact_history`.
+        """
+        pipe = self.redis_client.pipeline()
+        pipe.lrange(_history_key(session_id), 0, -1)
+        pipe.expire(_history_key(session_id), self.ttl)
+        records, _ = pipe.execute()
+        if not records:
+            return []
+
+        try:
+            plan = _LoadPlan(records, token_budget)
+            blobs = {}
+            if digests := plan.digests():
+                pipe = self.redis_client.pipeline()
+                pipe.mget([_blob_key(d) for d in digests])
+                for digest in digests:
+                    pipe.expire(_blob_key(digest), self.ttl)
+                blobs = dict(zip(digests, pipe.execute()[0]))
+            return plan.resolve(blobs)
+        except ValueError as e:
+            print(f"Discarding unreadable history for {session_id}: {e}")
+            return []
+
+    def append(self, session_id: str, messages: list) -> None:
+        """
+        Appends new messages to the session's history and resets its TTL.
+        """
+        if not messages:
+            return
+        records, blobs = _encode_messages(messages)
+        pipe = self.redis_client.pipeline()
+        for digest, payload in blobs.items():
+            pipe.set(_blob_key(digest), payload, ex=self.ttl)
+        pipe.rpush(_history_key(session_id), *records)
+        pipe.ltrim(_history_key(session_id), -HISTORY_MAX_RECORDS, -1)
+        pipe.expire(_history_key(session_id), self.ttl)
+        pipe.execute()
+
+
+class AsyncHistoryStore:
+    """
+    `HistoryStore` for the asyncio Redis client.
+    """
+
+    def __init__(self, redis_client, ttl: int = HISTORY_TTL) -> None:
+        self.redis_client = redis_client
+        self.ttl = ttl
+
+    async def load(self, session_id: str, token_budget: Optional[int] = None) -> list:
+        async with self.redis_client.pipeline() as pipe:
+            pipe.lrange(_history_key(session_id), 0, -1)
+            pipe.expire(_history_key(session_id), self.ttl)
+            records, _ = await pipe.execute()
+        if not records:
+            return []
+
+        try:
+            plan = _LoadPlan(records, token_budget)
+            blobs = {}
+            if digests := plan.digests():
+                async with self.redis_client.pipeline() as pipe:
+                    pipe.mget([_blob_key(d) for d in digests])
+                    for digest in digests:
+                        pipe.expire(_blob_key(digest), self.ttl)
+                    blobs = dict(zip(digests, (await pipe.execute())[0]))
+            return plan.resolve(blobs)
+        except ValueError as e:
+            print(f"Discarding unreadable history for {session_id}: {e}")
+            return []
+
+    async def append(self, session_id: str, messages: list) -> None:
+        if not messages:
+            return
+        records, blobs = _encode_messages(messages)
+        async with self.redis_client.pipeline() as pipe:
+            for digest, payload in blobs.items():
+                pipe.set(_blob_key(digest), payload, ex=self.ttl)
+            pipe.rpush(_history_key(session_id), *records)
+            pipe.ltrim(_history_key(session_id), -HISTORY_MAX_RECORDS, -1)
+            pipe.expire(_history_key(session_id), self.ttl)
+            await pipe.execute()
@@ -0,0 +1,200 @@
+import time
+import threading
+from collections import Counter
+from fnmatch import fnmatch
+from typing import Optional
+
+import redis
+import requests_cache
+from requests.adapters import HTTPAdapter
+from requests_cache import DO_NOT_CACHE
+from requests_cache.backends.filesystem import FileCache
+from requests_cache.backends.redis import RedisCache
+
+from src.ratelimit import RateLimitedAdapter, TokenBucket
+
+HTTP_CACHE_NAME = "botenders_gov_simplify_cache"
+DEFAULT_POOL_SIZE = 8
+DEFAULT_EXPIRE_AFTER = 3600 * 24  # Policies rarely change on a daily basis
+RATE_LIMITED_PREFIX = "https://api.regulations.gov/"
+REDIS_RETRY_INTERVAL = 60  # seconds on the file fallback before trying Redis again
+
+# Per-endpoint expiry, first match wins: (metrics name, URL glob, expire_after)
+ENDPOINT_POLICIES = [
+    # Metadata of a single document
+    ("document", "api.regulations.gov/v4/documents/*", 3600 * 24),
+    # Listings are re-read by the incremental sync, so keep them short-lived
+    ("listing", "api.regulations.gov/v4/documents", 3600),
+    # Full rule text runs to megabytes; the part that is reused, the summary, is kept
+    # per lastModifiedDate in `src.corpus.ParsedDocumentStore` instead
+    ("download", "downloads.regulations.gov/*", DO_NOT_CACHE),
+    # News has its own stale-while-revalidate cache in `Server`
+    ("news", "newsdata.io/*", DO_NOT_CACHE),
+]
+
+_STATS_KEY = "cache_stats:http"
+
+_state = {"redis_client": None, "session": None, "backend": None, "retry_at": 0.0}
+_local_stats = Counter()
+_lock = threading.Lock()
+
+
+def _endpoint(url: str) -> str:
+    url = url.split("://")[-1]
+    for name, pattern, _ in ENDPOINT_POLICIES:
+        if fnmatch(url, pattern.rstrip("*") + "**"):
+            return name
+    return "other"
+
+
+class _MeteredSession(requests_cache.CachedSession):
+    """
+    Cached session that counts hits and misses per endpoint.
+
+    If Redis fails after startup, the session moves to the local file cache and retries
+    the request there; it goes back to Redis once a ping succeeds again, checked at most
+    every `REDIS_RETRY_INTERVAL` seconds.
+    """
+
+    def send(self, request, **kwargs):
+        if _state["backend"] == "file" and time.monotonic() >= _state["retry_at"]:
+            self._try_redis()
+        try:
+            response = super().send(request, **kwargs)
+        except redis.RedisError as e:
+            self._use_files(e)
+            response = super().send(request, **kwargs)
+        endpoint = _endpoint(request.url)
+        if endpoint != "news":
+            _record(endpoint, "hits" if getattr(response, "from_cache", False) else "misses")
+        return response
+
+    def _use_files(self, error: Exception) -> None:
+        with _lock:
+            if _state["backend"] == "redis":
+                print(f"Redis failed for the HTTP cache, using local files: {error}")
+                self.cache = FileCache(HTTP_CACHE_NAME)
+                _state["backend"] = "file"
+            _state["retry_at"] = time.monotonic() + REDIS_RETRY_INTERVAL
+
+    def _try_redis(self) -> None:
+        client = _state["redis_client"] or redis.StrictRedis()
+        with _lock:
+            _state["retry_at"] = time.monotonic() + REDIS_RETRY_INTERVAL
+        try:
+            client.ping()
+        except redis.RedisError:
+            return
+        with _lock:
+            if _state["backend"] == "file":
+                print("Redis is back, moving the HTTP cache off local files")
+                self.cache = RedisCache(HTTP_CACHE_NAME, connection=client)
+                _state["redis_client"] = client
+                _state["backend"] = "redis"
+
+
+def _record(endpoint: str, outcome: str) -> None:
+    field = f"{endpoint}:{outcome}"
+    if _state["backend"] == "redis":
+        try:
+            _state["redis_client"].hincrby(_STATS_KEY, field, 1)
+            return
+        except redis.RedisError:
+            pass
+    with _lock:
+        _local_stats[field] += 1
+
+
+def configure(redis_client: Optional[redis.StrictRedis] = None) -> None:
+    """
+    Sets the Redis connection the HTTP cache should use.
+
+    Call this before the first request (the `Server` does so on startup); otherwise a
+    client for localhost is used.
+    """
+    with _lock:
+        _state["redis_client"] = redis_client
+        _state["session"] = None
+
+
+def _create_backend():
+    client = _state["redis_client"] or redis.StrictRedis()
+    try:
+        client.ping()
+        _state["redis_client"] = client
+        _state["backend"] = "redis"
+        return RedisCache(HTTP_CACHE_NAME, connection=client)
+    except redis.RedisError as e:
+        print(f"Redis unavailable for the HTTP cache, using local files: {e}")
+        _state["backend"] = "file"
+        _state["retry_at"] = time.monotonic() + REDIS_RETRY_INTERVAL
+        return FileCache(HTTP_CACHE_NAME)
+
+
+def get_session() -> requests_cache.CachedSession:
+    """
+    Returns the process-wide cached session for all outbound GET requests.
+
+    Responses are shared across workers through Redis (falling back to a local file
+    cache whenever Redis is unreachable) and expire per `ENDPOINT_POLICIES`. The session
+    keeps a pool of `DEFAULT_POOL_SIZE` keep-alive connections per host.
+
+    Requests to the Regulations.gov API that miss the cache go through a token bucket
+    shared with every other worker (see `src.ratelimit`).
+    """
+    with _lock:
+        if _state["session"] is None:
+            session = _MeteredSession(
+                backend=_create_backend(),
+                expire_after=DEFAULT_EXPIRE_AFTER,
+                urls_expire_after={
+                    pattern: expire_after
+                    for _, pattern, expire_after in ENDPOINT_POLICIES
+                },
+                allowable_methods=["GET"],
+            )
+            adapter = HTTPAdapter(
+                pool_connections=DEFAULT_POOL_SIZE, pool_maxsize=DEFAULT_POOL_SIZE
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            bucket = TokenBucket(
+                _state["redis_client"] if _state["backend"] == "redis" else None
+            )
+            session.mount(
+                RATE_LIMITED_PREFIX,
+                RateLimitedAdapter(
+                    bucket,
+                    pool_connections=DEFAULT_POOL_SIZE,
+                    pool_maxsize=DEFAULT_POOL_SIZE,
+                ),
+            )
+            _state["session"] = session
+        return _state["session"]
+
+
+def stats() -> dict:
+    """
+    Returns hit and miss counts and the hit rate per endpoint.
+
+    With the Redis backend the counts cover all workers; with the file fallback they
+    cover this process only.
+    """
+    counters = Counter()
+    with _lock:
+        counters.update(_local_stats)
+    if _state["backend"] == "redis":
+        try:
+            for field, value in _state["redis_client"].hgetall(_STATS_KEY).items():
+                counters[field.decode()] += int(value)
+        except redis.RedisError:
+            pass
+
+    endpoints = {}
+    for field, value in counters.items():
+        endpoint, outcome = field.split(":")
+        endpoints.setdefault(endpoint, {"hits": 0, "misses": 0})[outcome] = value
+    for entry in endpoints.values():
+        lookups = entry["hits"] + entry["misses"]
+        entry["hit_rate"] = entry["hits"] / lookups if lookups else 0.0
+    return {"backend": _state["backend"], "endpoints": endpoints}
@@ -1,7 +1,7 @@
-import requests
+from src.http_cache import get_session
 
 
-def fetch_news_with_query(api_key, query, mode="latest"):
+def fetch_news_with_query(api_key, query, mode="latest", session=None):
     """
     Fetch news articles from the NewsData.io API based on a query and mode.
 
@@ -9,11 +9,12 @@ def fetch_news_with_query(api_key, query, mode="latest"):
         api_key (str): API key for authentication.
         query (str): Search term for querying articles.
         mode (str, optional): Request mode ('latest' or 'archive'). Defaults to 'latest'.
+        session (requests.Session, optional): Session object to use for the request.
 
     Returns:
         dict: JSON response from the NewsData.io API.
     """
     url = f'https://newsdata.io/api/1/{mode}?apikey={api_key}&language=en&removeduplicate=1&q="{query}"'
-    response = requests.get(url)
+    response = (session or get_session()).get(url)
     response.raise_for_status()
     return response.json()
@@ -0,0 +1,161 @@
+import os
+import queue
+import threading
+import time
+import multiprocessing
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from src.agencies import (
+    DEFAULT_POOL_SIZE,
+    DEFAULT_SUMMARY_WORKERS,
+    iter_agency_pages,
+    summarize_doc,
+)
+
+DEFAULT_QUEUE_SIZE = 256  # documents waiting for a summary worker
+# Processes for the HTML parsing stage; 0 streams and parses summaries in the worker threads
+DEFAULT_PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0"))
+
+_DONE = object()
+
+
+class IngestionProgress:
+    """
+    Counters for the listing and summary stages of an ingestion run.
+    """
+
+    def __init__(self, agency: str) -> None:
+        self.agency = agency
+        self.total_pages = None
+        self.pages = 0
+        self.listed = 0
+        self.summarized = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def page_listed(self, total_pages: int, queued: int) -> None:
+        with self._lock:
+            self.total_pages = total_pages
+            self.pages += 1
+            self.listed += queued
+
+    def doc_summarized(self, doc: dict) -> None:
+        with self._lock:
+            self.summarized += 1
+            if "error" in doc:
+                self.failed += 1
+
+    def __str__(self) -> str:
+        return (
+            f"{self.agency}: pages {self.pages}/{self.total_pages or '?'}, "
+            f"summarized {self.summarized}/{self.listed} "
+            f"({self.failed} failed) in {time.monotonic() - self.started:.1f}s"
+        )
+
+
+def _print_progress(progress: IngestionProgress) -> None:
+    print(progress, end="\r", flush=True)
+
+
+def ingest_agency(
+    api_key: str,
+    agency: str,
+    last_modified_since: Optional[str] = None,
+    accept: Optional[Callable[[dict], bool]] = None,
+    doc_type="Rule",
+    store=None,
+    list_workers: int = DEFAULT_POOL_SIZE,
+    summary_workers: int = DEFAULT_SUMMARY_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    parse_workers: int = DEFAULT_PARSE_WORKERS,
+    on_progress: Callable[[IngestionProgress], None] = _print_progress,
+) -> List[dict]:
+    """
+    Lists an agency and summarizes its documents as a two-stage pipeline.
+
+    Listing pages feed their documents into a bounded queue as soon as each page
+    arrives, and summary workers drain the queue continuously, so summarizing starts
+    with the first page and no worker waits on another. The queue bound keeps the
+    listing from running arbitrarily far ahead of the summaries.
+
+    With `parse_workers` set, summary workers only download: the start of each page,
+    up to the end of its summary section, is handed to a process pool as raw bytes and
+    parsed there, so parsing scales past the GIL.
+
+    Args:
+        api_key (str): API key for the Regulations.gov API.
+        agency (str): The agency ID to ingest.
+        last_modified_since (str, optional): Only list documents modified at or after this time.
+        accept (callable, optional): Predicate selecting which listed documents to ingest.
+        doc_type (str or iterable): Document types to summarize (see `summarize_doc`).
+        store (ParsedDocumentStore, optional): Parsed-output store for the summary stage.
+        list_workers (int): Maximum number of listing pages fetched at the same time.
+        summary_workers (int): Number of summary workers.
+        queue_size (int): Maximum number of listed documents waiting for a worker.
+        parse_workers (int): Size of the parsing process pool, or 0 for no pool.
+        on_progress (callable): Called with the progress counters after every page and document.
+
+    Returns:
+        list: The ingested documents, with summaries attached, in completion order.
+    """
+    if doc_type != "All" and isinstance(doc_type, str):
+        doc_type = [doc_type]
+
+    progress = IngestionProgress(agency)
+    work = queue.Queue(maxsize=queue_size)
+    results = []
+    results_lock = threading.Lock()
+
+    def list_documents():
+        try:
+            for total_pages, docs in iter_agency_pages(
+                api_key,
+                agency,
+                max_workers=list_workers,
+                last_modified_since=last_modified_since,
+            ):
+                docs = [doc for doc in docs if accept is None or accept(doc)]
+                progress.page_listed(total_pages, len(docs))
+                on_progress(progress)
+                for doc in docs:
+                    work.put(doc)
+        finally:
+            for _ in range(summary_workers):
+                work.put(_DONE)
+
+    def summarize_documents():
+        while (doc := work.get()) is not _DONE:
+            try:
+                doc = summarize_doc(
+                    api_key, doc, doc_type, store=store, parse_pool=parse_pool
+                )
+            except Exception as e:
+                doc["error"] = str(e)
+            with results_lock:
+                results.append(doc)
+            progress.doc_summarized(doc)
+            on_progress(progress)
+
+    # "spawn" keeps the pool from forking this (threaded) process
+    parse_pool = (
+        ProcessPoolExecutor(
+            max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        if parse_workers
+        else None
+    )
+    with parse_pool or nullcontext(), ThreadPoolExecutor(
+        max_workers=summary_workers + 1, thread_name_prefix=f"ingest-{agency}"
+    ) as executor:
+        lister = executor.submit(list_documents)
+        workers = [executor.submit(summarize_documents) for _ in range(summary_workers)]
+        for future in workers:
+            future.result()
+        lister.result()
+
+    if on_progress is _print_progress:
+        print()
+    return results
@@ -1,11 +1,41 @@
-from datetime import datetime
-from jinja2 import Template
-from typing import Tuple
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from jinja2 import Environment
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
-from src.agencies import fetch_agency, fetch_doc_summaries
+from src.corpus import sync_agency
+from src.documents import Document, as_document
 
 
-TEMPLATE = """
+# Whole-corpus prompts are packed into this many tokens, leaving room for the chat itself
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1900000"))
+FLASH_TOKEN_LIMIT = 900_000  # larger prompts are served by the pro model
+
+# Document ranking for packing
+DOCUMENT_TYPE_WEIGHTS = {"Rule": 3.0, "Proposed Rule": 2.0, "Notice": 1.0}
+RECENCY_HALF_LIFE_DAYS = 730
+WITHDRAWN_WEIGHT = 0.1
+
+_TOKEN_PIECE_RE = re.compile(r"[^\W\d_]+|\S")
+
+# Memory for rendered documents kept between prompt builds (see `FragmentCache`). A full
+# prompt is about four bytes per token, so the default holds a few agencies' fragments.
+FRAGMENT_CACHE_BYTES = int(os.getenv("PROMPT_FRAGMENT_CACHE_MB", "32")) * 1024 * 1024
+# Token estimates kept for packing, at about 150 bytes each
+TOKEN_CACHE_SIZE = int(os.getenv("PROMPT_TOKEN_CACHE_SIZE", "250000"))
+
+
+class PromptPlan(NamedTuple):
+    prompt: str
+    model_name: str
+    decision: dict
+
+
+INSTRUCTIONS = """
 You are a policy analyst specializing in regulatory and policy analysis. Your role is to review and provide insights based on the provided regulatory documents, focusing on:
 1. Policy Objectives and Scope
 2. Stakeholder Impacts
@@ -37,9 +67,10 @@ Your workflow should include:
    - Focus on the purpose and background of policies, specific requirements or actions described, and relevant deadlines.
    - Consider potential effects on stakeholders (e.g., individuals, businesses, agencies) and implications for enforcement or compliance.
 
-Documents for Analysis:
-{% for doc in documents %}
----
+"""
+
+# One document as listed in a prompt
+DOCUMENT_TEMPLATE = """---
 **Title**: {{ doc.attributes.title | default('No title available') }}
 **Document Type**: {{ doc.attributes.documentType | default('Unknown') }}
 **Published On**: {{ doc.attributes.postedDate | default('Unknown date') }}
@@ -52,29 +83,284 @@ Documents for Analysis:
 **Action Required**: Full content is missing. Fetch only if the document is highly relevant to the user query based on its type, recency, or criticality.
 {% endif %}
 ---
-{% endfor %}
+"""
+
+DOCUMENTS_HEADER = "Documents for Analysis:\n"
 
+CRITICAL_NOTE = """
 ---
 
 **Critical Note**:
 - Analyze metadata first to identify a small subset of highly relevant documents (e.g., 3-5) for further detail retrieval.
 - Only fetch documents that are critical to understanding key policy impacts or compliance requirements.
 - Avoid unnecessary fetches by relying on metadata and summaries wherever possible.
-- Always aim to deliver a complete and actionable analysis with minimal reliance on document fetches.
+- Always aim to deliver a complete and actionable analysis with minimal reliance on document fetches."""
+
+# The whole-corpus prompt as a single template. `render_prompt` produces the same text
+# from pre-rendered document fragments instead of rendering this.
+TEMPLATE = (
+    INSTRUCTIONS
+    + DOCUMENTS_HEADER
+    + "{% for doc in documents %}\n"
+    + DOCUMENT_TEMPLATE
+    + "{% endfor %}\n"
+    + CRITICAL_NOTE
+    + "\n"
+)
+
+
+RETRIEVAL_NOTE = """Documents for Analysis:
+Each user message is followed by the agency documents most relevant to it, retrieved from the full corpus. Base your analysis on those documents, and use their links with `fetch_document_details` when more detail is needed.
 """
 
+RETRIEVED_DOCUMENTS_HEADER = "Documents retrieved for this message:\n"
+
+RETRIEVED_DOCUMENTS_TEMPLATE = (
+    RETRIEVED_DOCUMENTS_HEADER
+    + "{% for doc in documents %}\n"
+    + DOCUMENT_TEMPLATE
+    + "{% endfor %}"
+)
+
+# Compiled once; keeping the trailing newline makes one document's output exactly one
+# iteration of the loop in `TEMPLATE`
+_DOCUMENT = Environment(keep_trailing_newline=True).from_string(
+    "\n" + DOCUMENT_TEMPLATE
+)
+
+
+class FragmentCache:
+    """
+    LRU caches of rendered document entries and of their estimated tokens.
+
+    Entries are keyed by document id, `lastModifiedDate` and summary, so a revised or
+    newly summarized document is rendered again while unchanged ones are reused.
+
+    Packing needs the cost of every document in the corpus but the text of only those
+    that fit, so the two are kept apart. Token estimates are small and keyed by a hash
+    of the key, which keeps no summary alive; up to `max_token_entries` are kept. Rendered
+    text is only cached for documents that make it into a prompt, and the least
+    recently used entries are evicted once the text and the summaries held by the keys
+    take more than `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = FRAGMENT_CACHE_BYTES,
+        max_token_entries: int = TOKEN_CACHE_SIZE,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_token_entries = max_token_entries
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (text, size)
+        self._tokens = OrderedDict()  # hash(key) -> tokens
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.token_hits = 0
+        self.token_misses = 0
+
+    @staticmethod
+    def _key(doc: Document) -> Optional[tuple]:
+        if doc.id is None or doc.last_modified_date is None:
+            return None  # no way to tell whether it changed
+        return doc.id, doc.last_modified_date, doc.summary
+
+    def get(self, doc) -> str:
+        """
+        Returns the rendered entry for `doc` (a `Document` or API dict).
+        """
+        doc = as_document(doc)
+        key = self._key(doc)
+        if key is not None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+
+        text = _DOCUMENT.render(doc=doc)
+        with self._lock:
+            self.misses += 1
+            if key is not None:
+                size = sys.getsizeof(text) + sys.getsizeof(doc.summary)
+                if (old := self._entries.pop(key, None)) is not None:
+                    self.bytes -= old[1]
+                if size <= self.max_bytes:
+                    self._entries[key] = (text, size)
+                    self.bytes += size
+                while self.bytes > self.max_bytes:
+                    self.bytes -= self._entries.popitem(last=False)[1][1]
+        return text
+
+    def tokens(self, doc) -> int:
+        """
+        Returns the estimated tokens of the rendered entry for `doc`, without caching its text.
+        """
+        doc = as_document(doc)
+        key = self._key(doc)
+        if key is not None:
+            # A collision would only misjudge one document's cost
+            key = hash(key)
+            with self._lock:
+                tokens = self._tokens.get(key)
+                if tokens is not None:
+                    self._tokens.move_to_end(key)
+                    self.token_hits += 1
+                    return tokens
+
+        tokens = estimate_tokens(_DOCUMENT.render(doc=doc))
+        with self._lock:
+            self.token_misses += 1
+            if key is not None:
+                self._tokens[key] = tokens
+                self._tokens.move_to_end(key)
+                while len(self._tokens) > self.max_token_entries:
+                    self._tokens.popitem(last=False)
+        return tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "token_entries": len(self._tokens),
+                "token_hits": self.token_hits,
+                "token_misses": self.token_misses,
+            }
+
+
+fragment_cache = FragmentCache()
+
+
+def iter_prompt(documents: Iterable[Document]) -> Iterator[str]:
+    """
+    Yields the whole-corpus prompt for `documents` piece by piece, as `TEMPLATE` would
+    render it, reusing cached document fragments.
+    """
+    yield INSTRUCTIONS
+    yield DOCUMENTS_HEADER
+    for doc in documents:
+        yield fragment_cache.get(doc)
+    yield "\n"
+    yield CRITICAL_NOTE
 
-def generate_prompt(api_key: str, agency: str) -> str:
-    data = fetch_agency(api_key, agency)
-    documents = fetch_doc_summaries(api_key, data)
 
-    template = Template(TEMPLATE)
-    prompt = template.render(documents=documents)
+def render_prompt(documents: Iterable[Document]) -> str:
+    return "".join(iter_prompt(documents))
 
+
+def _with_current_date(prompt: str) -> str:
     current_date = datetime.now().strftime("%Y-%m-%d")
-    prompt = f"{prompt}\n\n---\n\n**Current Date:** {current_date}."
+    return f"{prompt}\n\n---\n\n**Current Date:** {current_date}."
+
+
+def generate_retrieval_prompt() -> str:
+    """
+    System instruction for retrieval mode: the analyst instructions without a corpus.
+    """
+    return _with_current_date(INSTRUCTIONS + RETRIEVAL_NOTE)
+
+
+def render_retrieved_documents(documents: List[Document]) -> str:
+    """
+    Renders the documents retrieved for one message, in the same format as the full prompt.
+    """
+    return RETRIEVED_DOCUMENTS_HEADER + "".join(
+        fragment_cache.get(doc) for doc in documents
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the Gemini token count of `text` without calling the API.
+
+    Words cost one token per seven letters (rounded up), while every digit and punctuation
+    mark costs one, as the Gemini tokenizer splits numbers into single digits. Prompts
+    full of dates, links and markdown therefore come out well above `len(text) // 4`.
+    """
+    tokens = 0
+    for piece in _TOKEN_PIECE_RE.findall(text):
+        tokens += (len(piece) + 6) // 7 if piece[0].isalpha() else 1
+    return tokens
+
+
+def score_document(doc: Document, now: Optional[datetime] = None) -> float:
+    """
+    Relevance of a document for the whole-corpus prompt: its type weight, halved for
+    every `RECENCY_HALF_LIFE_DAYS` since it was posted, and cut sharply if withdrawn.
+    """
+    doc = as_document(doc)
+    score = DOCUMENT_TYPE_WEIGHTS.get(doc.document_type, 1.0)
+
+    try:
+        posted = datetime.fromisoformat(doc.posted_date.replace("Z", "+00:00"))
+        age_days = ((now or datetime.now(timezone.utc)) - posted).days
+        score *= 0.5 ** (max(age_days, 0) / RECENCY_HALF_LIFE_DAYS)
+    except (AttributeError, TypeError, ValueError):
+        pass  # undated documents are not discounted
 
-    return prompt
+    if doc.withdrawn:
+        score *= WITHDRAWN_WEIGHT
+    return score
+
+
+def pack_documents(documents: List[Document], token_budget: int) -> Tuple[List[Document], int]:
+    """
+    Picks the highest-scoring documents whose rendered entries fit in `token_budget`.
+
+    Returns:
+        tuple: (selected documents in their original order, their estimated tokens)
+    """
+    now = datetime.now(timezone.utc)
+    ranked = sorted(
+        range(len(documents)), key=lambda i: -score_document(documents[i], now)
+    )
+
+    selected = []
+    used = 0
+    for i in ranked:
+        cost = fragment_cache.tokens(documents[i])
+        if used + cost <= token_budget:
+            selected.append(i)
+            used += cost
+    return [documents[i] for i in sorted(selected)], used
+
+
+def build_prompt(
+    api_key: str, agency: str, token_budget: int = PROMPT_TOKEN_BUDGET
+) -> PromptPlan:
+    """
+    Builds the agency's whole-corpus prompt within `token_budget` and picks its model.
+
+    When the corpus does not fit, the lowest-scoring documents (see `score_document`) are
+    left out; they stay reachable through Google Search and later prompt builds.
+
+    Returns:
+        PromptPlan: The prompt, the model to serve it with, and a summary of the decision.
+    """
+    documents = sync_agency(api_key, agency)
+    overhead = estimate_tokens(_with_current_date(render_prompt([])))
+    packed, _ = pack_documents(documents, token_budget - overhead)
+
+    prompt = _with_current_date(render_prompt(packed))
+    estimated_tokens, model_name = determine_model_and_tokens(prompt)
+    decision = {
+        "model": model_name,
+        "documents": len(documents),
+        "packed_documents": len(packed),
+        "estimated_tokens": estimated_tokens,
+        "token_budget": token_budget,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+    }
+    return PromptPlan(prompt, model_name, decision)
+
+
+def generate_prompt(api_key: str, agency: str) -> str:
+    return build_prompt(api_key, agency).prompt
 
 
 def determine_model_and_tokens(
@@ -90,14 +376,15 @@ def determine_model_and_tokens(
     Returns:
         tuple: (approx_tokens, model_name)
     """
-    # Calculate approximate token count (4 characters per token approximation)
-    approx_tokens = len(prompt) // 4
+    approx_tokens = estimate_tokens(prompt)
 
     # Check if token count exceeds the limit
     if approx_tokens > token_limit:
         raise ValueError(f"Token count exceeds the limit of {token_limit}.")
 
-    # Determine model based on token count thresholds
-    model_name = "gemini-1.5-pro" if approx_tokens > 900_000 else "gemini-1.5-flash"
+    # Flash is faster and cheaper; only prompts near its context window need pro
+    model_name = (
+        "gemini-1.5-pro" if approx_tokens > FLASH_TOKEN_LIMIT else "gemini-1.5-flash"
+    )
 
     return approx_tokens, model_name
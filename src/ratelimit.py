@@ -0,0 +1,208 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import redis
+from requests.adapters import HTTPAdapter
+
+# Regulations.gov keys are limited per hour (api.data.gov default: 1,000 requests)
+HOURLY_QUOTA = int(os.getenv("REGULATIONS_GOV_HOURLY_QUOTA", "1000"))
+INTERACTIVE_RESERVE = 0.05  # share of the bucket only interactive requests may use
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+RETRY_STATUSES = {429, 503}
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_CAP = 60.0
+MAX_SLEEP = 5.0  # re-check the bucket at least this often while waiting
+
+_priority = contextvars.ContextVar("request_priority", default=BACKGROUND)
+
+# Takes one token if the bucket (minus the reserve) allows it. Returns the number of
+# seconds to wait before asking again, as a string since Redis truncates Lua floats.
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'blocked_until')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+local blocked_until = tonumber(state[3]) or 0
+if blocked_until > now then
+    return tostring(blocked_until - now)
+end
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens - 1 >= reserve then
+    tokens = tokens - 1
+else
+    wait = (reserve + 1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+_BLOCK_SCRIPT = """
+local t = redis.call('TIME')
+local blocked_until = tonumber(t[1]) + tonumber(t[2]) / 1000000 + tonumber(ARGV[1])
+local current = tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0
+if blocked_until > current then
+    redis.call('HSET', KEYS[1], 'blocked_until', tostring(blocked_until))
+end
+return 1
+"""
+
+
+@contextmanager
+def request_priority(priority: str):
+    """
+    Runs the enclosed requests at `priority` (`INTERACTIVE` or `BACKGROUND`).
+
+    Requests default to `BACKGROUND`; the priority is per thread (or task), so set it in
+    the thread that makes the requests.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `hourly_quota` tokens per hour, shared by all workers.
+
+    The bucket lives in a Redis hash and is updated atomically by a Lua script using the
+    Redis server clock. Background requests leave the last `INTERACTIVE_RESERVE` of the
+    bucket to interactive ones, so user-facing calls get through during a crawl. When
+    Redis is not available, or a call to it fails, the bucket is kept in this process
+    instead.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.StrictRedis] = None,
+        key: str = "ratelimit:regulations_gov",
+        hourly_quota: int = HOURLY_QUOTA,
+        capacity: Optional[int] = None,
+    ) -> None:
+        self.redis_client = redis_client
+        self.key = key
+        self.rate = hourly_quota / 3600
+        self.capacity = capacity or hourly_quota
+        self.reserve = self.capacity * INTERACTIVE_RESERVE
+        self._lock = threading.Lock()
+        self._local = {
+            "tokens": self.capacity,
+            "updated": time.time(),
+            "blocked_until": 0,
+        }
+        if redis_client is not None:
+            self._acquire_script = redis_client.register_script(_ACQUIRE_SCRIPT)
+            self._block_script = redis_client.register_script(_BLOCK_SCRIPT)
+
+    def _try_acquire(self, priority: str) -> float:
+        reserve = 0 if priority == INTERACTIVE else self.reserve
+        if self.redis_client is not None:
+            try:
+                wait = self._acquire_script(
+                    keys=[self.key], args=[self.rate, self.capacity, reserve]
+                )
+                return float(wait)
+            except redis.RedisError:
+                pass
+
+        with self._lock:
+            now = time.time()
+            state = self._local
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            state["tokens"] = min(
+                self.capacity, state["tokens"] + (now - state["updated"]) * self.rate
+            )
+            state["updated"] = now
+            if state["tokens"] - 1 >= reserve:
+                state["tokens"] -= 1
+                return 0.0
+            return (reserve + 1 - state["tokens"]) / self.rate
+
+    def acquire(self, priority: str = BACKGROUND) -> None:
+        """
+        Blocks until a token is available for a request at `priority`.
+        """
+        while (wait := self._try_acquire(priority)) > 0:
+            time.sleep(min(wait, MAX_SLEEP) * random.uniform(0.8, 1.0))
+
+    def block(self, seconds: float) -> None:
+        """
+        Stops every worker from sending requests for `seconds` (e.g. after a 429).
+        """
+        if self.redis_client is not None:
+            try:
+                self._block_script(keys=[self.key], args=[seconds])
+                return
+            except redis.RedisError:
+                pass
+        with self._lock:
+            self._local["blocked_until"] = max(
+                self._local["blocked_until"], time.time() + seconds
+            )
+
+
+def _retry_after(response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTP adapter that takes a token from `bucket` before every request and retries
+    rate-limited responses.
+
+    A 429 or 503 with `Retry-After` pauses all workers for that long; without it the
+    request is retried after an exponential backoff with full jitter. After
+    `retries` attempts the last response is returned as-is.
+    """
+
+    def __init__(self, bucket: TokenBucket, retries: int = MAX_RETRIES, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket = bucket
+        self.retries = retries
+
+    def send(self, request, **kwargs):
+        priority = _priority.get()
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire(priority)
+            response = super().send(request, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return response
+
+            retry_after = _retry_after(response)
+            response.close()
+            if retry_after is not None:
+                url = request.url.split("?")[0]
+                print(f"Rate limited by {url}, pausing {retry_after:.0f}s")
+                self.bucket.block(retry_after)
+            else:
+                backoff = min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt)
+                time.sleep(random.uniform(0, backoff))
+        return response
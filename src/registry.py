@@ -0,0 +1,76 @@
+import json
+import datetime
+import threading
+from typing import NamedTuple, Optional
+
+from google.generativeai import caching
+
+
+class RegistryEntry(NamedTuple):
+    cache: caching.CachedContent
+    expire_time: datetime.datetime
+
+
+class ModelCacheRegistry:
+    """
+    Maps model cache display names (one per agency) to their Gemini cached content.
+
+    The name and expiry of each cache live in a Redis hash so every worker sees the
+    same mapping, and each worker keeps the `CachedContent` objects it has resolved.
+    A lookup therefore costs one Redis read, plus a single get-by-name call the first
+    time a worker sees a cache, instead of listing every cached content remotely.
+    """
+
+    def __init__(self, redis_client, key: str = "model_caches") -> None:
+        self.redis_client = redis_client
+        self._key = key
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def get(self, cache_name: str) -> Optional[RegistryEntry]:
+        """
+        Returns the registered, unexpired cache for `cache_name`, or None.
+        """
+        raw = self.redis_client.hget(self._key, cache_name)
+        if raw is None:
+            with self._lock:
+                self._local.pop(cache_name, None)
+            return None
+
+        entry = json.loads(raw)
+        expire_time = datetime.datetime.fromisoformat(entry["expire_time"])
+        if expire_time <= datetime.datetime.now(datetime.timezone.utc):
+            return None
+
+        with self._lock:
+            cache = self._local.get(cache_name)
+        if cache is None or cache.name != entry["name"]:
+            try:
+                cache = caching.CachedContent.get(entry["name"])
+            except Exception as e:
+                print(f"Registered cache {entry['name']} is unavailable: {e}")
+                self.remove(cache_name)
+                return None
+            with self._lock:
+                self._local[cache_name] = cache
+
+        return RegistryEntry(cache, expire_time)
+
+    def register(self, cache_name: str, cache: caching.CachedContent) -> None:
+        """
+        Records `cache` (and its current expiry) as the cache for `cache_name`.
+        """
+        with self._lock:
+            self._local[cache_name] = cache
+        self.redis_client.hset(
+            self._key,
+            cache_name,
+            json.dumps(
+                {"name": cache.name, "expire_time": cache.expire_time.isoformat()}
+            ),
+        )
+
+    def remove(self, cache_name: str) -> None:
+        with self._lock:
+            self._local.pop(cache_name, None)
+        self.redis_client.hdel(self._key, cache_name)
@@ -0,0 +1,191 @@
+import os
+import re
+import json
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.corpus import CorpusStore, sync_agency
+from src.documents import Document, as_document
+
+RETRIEVAL_INDEX_DIR = Path(os.getenv("RETRIEVAL_INDEX_DIR", "retrieval_index"))
+DEFAULT_TOP_K = 8
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _document_text(doc: Document) -> str:
+    return " ".join(
+        str(value)
+        for value in (
+            doc.title,
+            doc.docket_id,
+            doc.document_type,
+            (doc.posted_date or "")[:10],
+            doc.summary,
+        )
+        if value
+    )
+
+
+class RetrievalIndex:
+    """
+    BM25 index over an agency's documents (title, docket id, type, date and summary).
+
+    The index is an inverted file in three NumPy arrays: `indptr` delimits each term's
+    postings, which are parallel arrays of document numbers and precomputed BM25
+    weights. A query sums the weights of its terms' postings with one `bincount`, so
+    search cost depends on the postings touched rather than on the corpus size.
+    """
+
+    def __init__(
+        self,
+        vocab: dict,
+        indptr: np.ndarray,
+        postings: np.ndarray,
+        weights: np.ndarray,
+        documents: List[Document],
+    ) -> None:
+        self.vocab = vocab
+        self.indptr = indptr
+        self.postings = postings
+        self.weights = weights
+        self.documents = documents
+
+    @classmethod
+    def build(cls, documents: List[dict]) -> "RetrievalIndex":
+        documents = [as_document(doc) for doc in documents]
+        vocab = {}
+        terms, doc_numbers, counts = [], [], []
+        doc_len = np.zeros(len(documents), dtype=np.float32)
+        for i, doc in enumerate(documents):
+            term_counts = Counter(tokenize(_document_text(doc)))
+            doc_len[i] = sum(term_counts.values())
+            for term, count in term_counts.items():
+                terms.append(vocab.setdefault(term, len(vocab)))
+                doc_numbers.append(i)
+                counts.append(count)
+
+        terms = np.asarray(terms, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")
+        terms = terms[order]
+        postings = np.asarray(doc_numbers, dtype=np.int32)[order]
+        tf = np.asarray(counts, dtype=np.float32)[order]
+
+        df = np.bincount(terms, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+
+        n = max(len(documents), 1)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_len = max(float(doc_len.mean()), 1.0) if len(documents) else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avg_len)
+        weights = idf[terms] * tf * (BM25_K1 + 1) / (tf + norm[postings])
+
+        return cls(
+            vocab,
+            indptr,
+            postings,
+            weights.astype(np.float32),
+            documents,
+        )
+
+    def search(
+        self, query: str, k: int = DEFAULT_TOP_K
+    ) -> List[Tuple[Document, float]]:
+        """
+        Returns up to `k` (document, score) pairs matching `query`, best first.
+        """
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or not self.documents:
+            return []
+
+        spans = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        scores = np.bincount(
+            np.concatenate([self.postings[s] for s in spans]),
+            weights=np.concatenate([self.weights[s] for s in spans]),
+            minlength=len(self.documents),
+        )
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.documents[i], float(scores[i])) for i in top]
+
+    def save(self, path: Path) -> None:
+        """
+        Writes the index to `path` atomically, so readers never see a partial file.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez_compressed(
+            tmp,
+            vocab=np.frombuffer("\n".join(terms).encode(), dtype=np.uint8),
+            indptr=self.indptr,
+            postings=self.postings,
+            weights=self.weights,
+            documents=np.frombuffer(
+                json.dumps([doc.to_dict() for doc in self.documents]).encode(),
+                dtype=np.uint8,
+            ),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "RetrievalIndex":
+        with np.load(path) as data:
+            vocab = data["vocab"].tobytes().decode()
+            terms = vocab.split("\n") if vocab else []
+            return cls(
+                {term: i for i, term in enumerate(terms)},
+                data["indptr"],
+                data["postings"],
+                data["weights"],
+                [
+                    Document.from_dict(doc)
+                    for doc in json.loads(data["documents"].tobytes())
+                ],
+            )
+
+
+def index_path(agency: str) -> Path:
+    return RETRIEVAL_INDEX_DIR / f"{agency}.npz"
+
+
+def build_agency_index(
+    api_key: Optional[str], agency: str, store: Optional[CorpusStore] = None
+) -> RetrievalIndex:
+    """
+    Builds and saves the retrieval index for an agency.
+
+    With an API key the agency is synced first; without one the index is built offline
+    from whatever the local corpus store already holds.
+    """
+    if api_key:
+        documents = sync_agency(api_key, agency, store=store)
+    else:
+        documents = (store or CorpusStore()).documents(agency)
+    index = RetrievalIndex.build(documents)
+    index.save(index_path(agency))
+    print(f"Indexed {len(documents)} documents for {agency} ({len(index.vocab)} terms)")
+    return index
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Offline build from the local corpus store: python -m src.retrieval EPA CMS ...
+    for agency in sys.argv[1:]:
+        build_agency_index(None, agency)
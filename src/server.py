@@ -1,14 +1,35 @@
-from io import BytesIO
+import os
+import json
 import time
+import asyncio
+import threading
 import redis
-import pickle
+import redis.asyncio
 import datetime
 import google.generativeai as genai
 from google.generativeai import caching
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional, Tuple
 
-from src.prompt import generate_prompt
+from src import http_cache
+from src.cache import ResultCache, SWRCache
+from src.prompt import (
+    PROMPT_TOKEN_BUDGET,
+    build_prompt,
+    fragment_cache,
+    generate_retrieval_prompt,
+    render_retrieved_documents,
+)
+from src.history import (
+    HISTORY_TOKEN_BUDGET,
+    AsyncHistoryStore,
+    HistoryStore,
+    compact_history,
+)
 from src.news import fetch_news_with_query
+from src.registry import ModelCacheRegistry, RegistryEntry
+from src.retrieval import RetrievalIndex, build_agency_index, index_path
+from src.uploads import UploadCache
 from src.tools import (
     FETCH_DOCUMENT_DETAILS,
     FETCH_LATEST_NEWS,
@@ -16,6 +37,39 @@ from src.tools import (
     parse_args_to_dict,
 )
 
+TRAFFIC_WINDOW_HOURS = 24
+MODEL_CACHE_TTL = datetime.timedelta(minutes=30)
+MODEL_CACHE_TTL_REFRESH = datetime.timedelta(minutes=10)
+# A rebuilt agency's old cache stays usable this long for turns already running on it
+SUPERSEDED_CACHE_TTL = datetime.timedelta(minutes=5)
+MODEL_BUILD_LOCK_TIMEOUT = 15 * 60  # seconds; prompt builds for large agencies take minutes
+MODEL_BUILD_WAIT = 60  # seconds a request waits for another worker's build
+TOOL_PROGRESS_MESSAGES = {
+    "fetch_document_details": "Fetching document {link}",
+    "fetch_latest_news": "Searching news for {query}",
+}
+# Gemini only caches contents of at least this many tokens; smaller prompts are kept in
+# Redis and sent with every request instead
+CACHE_MIN_TOKENS = 32_768
+UNCACHED_PROMPT_TTL = datetime.timedelta(hours=12)
+# Documents retrieved per message; 0 puts each agency's whole corpus in a cached prompt
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "0"))
+# Retrieval prompts are far below the cached-content minimum, so they are sent uncached
+RETRIEVAL_MODEL = "gemini-1.5-flash-002"
+WARMING_MESSAGE = (
+    "The {agency} analyst is still loading its documents. Please try again in a minute."
+)
+
+
+class ModelWarmingError(Exception):
+    """
+    Raised when an agency's model is being built by another worker and is not ready yet.
+    """
+
+    def __init__(self, agency: str) -> None:
+        super().__init__(f"Model for {agency} is still being built.")
+        self.agency = agency
+
 
 class Server:
     def __init__(
@@ -26,41 +80,46 @@ class Server:
         redis_host: str = "localhost",
         redis_port: int = 6379,
         redis_db: int = 0,
+        blocking_workers: int = 32,
+        tool_workers: int = 8,
+        history_token_budget: Optional[int] = HISTORY_TOKEN_BUDGET,
+        retrieval_top_k: int = RETRIEVAL_TOP_K,
+        prompt_token_budget: int = PROMPT_TOKEN_BUDGET,
     ) -> None:
         self.redis_client = redis.StrictRedis(
             host=redis_host, port=redis_port, db=redis_db
         )
+        self.async_redis_client = redis.asyncio.StrictRedis(
+            host=redis_host, port=redis_port, db=redis_db
+        )
+        self._blocking_executor = ThreadPoolExecutor(
+            max_workers=blocking_workers, thread_name_prefix="server-blocking"
+        )
+        # Separate from the blocking executor so a turn's tool calls never wait on it
+        self._tool_executor = ThreadPoolExecutor(
+            max_workers=tool_workers, thread_name_prefix="server-tools"
+        )
         self._gov_api_key = gov_api_key
         self._genai_api_key = genai_api_key
         self._news_api_key = news_api_key
+        self._model_caches = ModelCacheRegistry(self.redis_client)
+        self._history = HistoryStore(self.redis_client)
+        self._async_history = AsyncHistoryStore(self.async_redis_client)
+        self._history_token_budget = history_token_budget
+        self._uploads = UploadCache(self.redis_client)
+        self._document_cache = ResultCache(self.redis_client, "document_details")
+        self._news_cache = SWRCache(self.redis_client, "news")
+        http_cache.configure(self.redis_client)
+        self._retrieval_top_k = retrieval_top_k
+        self._prompt_token_budget = prompt_token_budget
+        self._indexes = {}
+        self._indexes_lock = threading.Lock()
         genai.configure(api_key=self._genai_api_key)
 
-    def _load_history(self, session_id: str) -> list:
-        """
-        Fetch chat history from Redis. If the session ID doesn't exist or has expired, return an empty list.
-        """
-        serialized_history = self.redis_client.get(session_id)
-        if serialized_history:
-            return pickle.loads(serialized_history)  # Deserialize the history
-        return []
-
-    def _save_history(self, session_id: str, history: list, ttl: int = 600) -> None:
-        """
-        Save chat history to Redis with a TTL (time-to-live) that resets on each update.
-
-        Args:
-            session_id (str): The unique session ID.
-            history (list): The chat history to save.
-            ttl (int): Time-to-live in seconds (default: 600 seconds or 10 minutes).
-        """
-        serialized_history = pickle.dumps(history)
-        # Use SETEX to store the value with a timeout
-        self.redis_client.setex(session_id, ttl, serialized_history)
-
     def _create_model_cache(
         self, cache_name: str, model_name: str, system_instruction: str
     ) -> caching.CachedContent:
-        return caching.CachedContent.create(
+        cache = caching.CachedContent.create(
             model=f"models/{model_name}-002",
             display_name=cache_name,
             system_instruction=system_instruction,
@@ -69,25 +128,49 @@ class Server:
                 FETCH_DOCUMENT_DETAILS,
                 "google_search_retrieval",
             ],
-            ttl=datetime.timedelta(minutes=30),
+            ttl=MODEL_CACHE_TTL,
         )
+        self._model_caches.register(cache_name, cache)
+        return cache
 
-    def _check_cache_exists(self, cache_name: str) -> bool:
+    def _find_model_cache(
+        self, cache_name: str, scan: bool = True
+    ) -> Optional[RegistryEntry]:
+        """
+        Looks a cache up in the registry, falling back to a single remote scan for caches
+        created before the registry knew about them unless `scan` is False.
+        """
+        if entry := self._model_caches.get(cache_name):
+            return entry
+        if not scan:
+            return None
+
+        now = datetime.datetime.now(datetime.timezone.utc)
         for c in caching.CachedContent.list():
-            if c.display_name == cache_name:
-                return True
-        return False
+            if c.display_name == cache_name and c.expire_time > now:
+                print(f"Found unregistered cache for {cache_name}")
+                self._model_caches.register(cache_name, c)
+                return RegistryEntry(c, c.expire_time)
+        return None
 
     def _get_model_cache(
-        self, cache_name: str, reset_ttl: bool
-    ) -> caching.CachedContent:
-        for c in caching.CachedContent.list():
-            if c.display_name == cache_name:
-                print(f"Found cache for {cache_name}")
-                if reset_ttl:
-                    c.update(ttl=datetime.timedelta(minutes=30))
-                return c
-        raise ValueError(f"Model cache for {cache_name} not found.")
+        self, cache_name: str, reset_ttl: bool, scan: bool = True
+    ) -> Optional[caching.CachedContent]:
+        """
+        Returns the live cache for `cache_name`, or None if it has to be built.
+
+        With `reset_ttl`, the TTL is only extended once the remaining lifetime drops below
+        `MODEL_CACHE_TTL_REFRESH`, rather than on every message.
+        """
+        entry = self._find_model_cache(cache_name, scan)
+        if entry is None:
+            return None
+
+        remaining = entry.expire_time - datetime.datetime.now(datetime.timezone.utc)
+        if reset_ttl and remaining < MODEL_CACHE_TTL_REFRESH:
+            entry.cache.update(ttl=MODEL_CACHE_TTL)
+            self._model_caches.register(cache_name, entry.cache)
+        return entry.cache
 
     def _create_model(
         self, name: str, model_name: str, system_instruction: str
@@ -124,95 +207,389 @@ class Server:
                         f"Failed to create cache after {max_retries} attempts: {e}"
                     )
 
+    def _build_model(self, name: str, agency: str) -> genai.GenerativeModel:
+        """
+        Builds the agency's prompt within the token budget and caches it on the model the
+        prompt size calls for, recording the decision for `stats()`.
+
+        Prompts below `CACHE_MIN_TOKENS` cannot be cached; they are stored in Redis and
+        served by `_get_uncached_model` instead.
+        """
+        plan = build_prompt(self._gov_api_key, agency, self._prompt_token_budget)
+        decision = dict(plan.decision)
+        prompt_key = f"model_prompt:{name}"
+
+        if decision["estimated_tokens"] < CACHE_MIN_TOKENS:
+            record = {"model": plan.model_name, "prompt": plan.prompt}
+            self.redis_client.set(prompt_key, json.dumps(record), ex=UNCACHED_PROMPT_TTL)
+            self._model_caches.remove(name)
+            model = self._get_uncached_model(name)
+            decision["cached"] = False
+        else:
+            model = self._create_model(name, plan.model_name, plan.prompt)
+            self.redis_client.delete(prompt_key)
+            decision["cached"] = True
+            if entry := self._model_caches.get(name):
+                usage = entry.cache.usage_metadata
+                decision["measured_tokens"] = usage.total_token_count
+        print(f"Built {name}: {decision}")
+        self.redis_client.hset("prompt_decisions", agency, json.dumps(decision))
+        return model
+
+    def _acquire_build_lock(self, cache_name: str) -> Optional[redis.lock.Lock]:
+        """
+        Takes the cross-worker lock for building `cache_name`, or returns None if another
+        worker already holds it.
+        """
+        lock = self.redis_client.lock(
+            f"model_build:{cache_name}", timeout=MODEL_BUILD_LOCK_TIMEOUT
+        )
+        return lock if lock.acquire(blocking=False) else None
+
+    def _release_build_lock(self, cache_name: str, lock: redis.lock.Lock) -> None:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            print(f"Build lock for {cache_name} expired before the build finished")
+        self.redis_client.publish(f"model_built:{cache_name}", "1")
+
+    def _get_uncached_model(self, name: str) -> Optional[genai.GenerativeModel]:
+        """
+        Returns the model for a prompt too small to cache, if one was built.
+        """
+        raw = self.redis_client.get(f"model_prompt:{name}")
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        return genai.GenerativeModel(
+            model_name=f"models/{record['model']}-002",
+            system_instruction=record["prompt"],
+            tools=[FETCH_DOCUMENT_DETAILS, "google_search_retrieval"],
+        )
+
+    def _lookup_model(
+        self, name: str, reset_ttl: bool, scan: bool = True
+    ) -> Optional[genai.GenerativeModel]:
+        # Checked first: it is a single Redis read, while a cache miss may list remotely
+        if model := self._get_uncached_model(name):
+            return model
+        if cache := self._get_model_cache(name, reset_ttl, scan):
+            return genai.GenerativeModel.from_cached_content(cached_content=cache)
+        return None
+
+    def _wait_for_model(
+        self, cache_name: str, timeout: float
+    ) -> Optional[genai.GenerativeModel]:
+        """
+        Waits up to `timeout` seconds for another worker to finish building `cache_name`.
+        """
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f"model_built:{cache_name}")
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                # Checked after subscribing so a build finishing in between is not missed.
+                # The builder registers its cache, so there is nothing to scan for.
+                model = self._lookup_model(cache_name, reset_ttl=False, scan=False)
+                remaining = deadline - time.monotonic()
+                if model or remaining <= 0:
+                    return model
+                pubsub.get_message(timeout=min(remaining, 5))
+        finally:
+            pubsub.close()
+
     def _get_model(self, agency: str, reset_ttl=True) -> genai.GenerativeModel:
+        """
+        Returns the agency's model, building its cache if needed.
+
+        Only one worker builds a given agency at a time. The others wait for its
+        notification for up to `MODEL_BUILD_WAIT` seconds and then raise
+        `ModelWarmingError`.
+        """
         name = f"{agency}_model"
-        if not self._check_cache_exists(name):
-            system_instruction = generate_prompt(self._gov_api_key, agency)
-            model = self._create_model(name, "gemini-1.5-pro", system_instruction)
-        else:
-            model = genai.GenerativeModel.from_cached_content(
-                cached_content=self._get_model_cache(name, reset_ttl)
+        if model := self._lookup_model(name, reset_ttl):
+            return model
+
+        lock = self._acquire_build_lock(name)
+        if lock is None:
+            print(f"Waiting for another worker to build {name}")
+            model = self._wait_for_model(name, MODEL_BUILD_WAIT)
+            if model is None:
+                raise ModelWarmingError(agency)
+            return model
+
+        try:
+            # Another worker may have finished between the lookup and taking the lock
+            if model := self._lookup_model(name, reset_ttl=False, scan=False):
+                return model
+
+            print(f"No warm cache for {agency}, building it on the request path")
+            return self._build_model(name, agency)
+        finally:
+            self._release_build_lock(name, lock)
+
+    def _get_index(self, agency: str) -> RetrievalIndex:
+        """
+        Returns the agency's retrieval index, reloading it when the file on disk changes.
+
+        A missing index is built on the request path by one worker; the others raise
+        `ModelWarmingError` meanwhile.
+        """
+        path = index_path(agency)
+        if not path.exists():
+            name = f"{agency}_index"
+            lock = self._acquire_build_lock(name)
+            if lock is None:
+                raise ModelWarmingError(agency)
+            try:
+                if not path.exists():
+                    print(f"No retrieval index for {agency}, building it now")
+                    build_agency_index(self._gov_api_key, agency)
+            finally:
+                self._release_build_lock(name, lock)
+
+        mtime = path.stat().st_mtime
+        with self._indexes_lock:
+            loaded = self._indexes.get(agency)
+        if loaded is None or loaded[0] != mtime:
+            loaded = (mtime, RetrievalIndex.load(path))
+            with self._indexes_lock:
+                self._indexes[agency] = loaded
+        return loaded[1]
+
+    def _prepare_turn(self, agency: str, message: str):
+        """
+        Returns the model for the agency and the content to send for `message`.
+
+        In retrieval mode the model carries only the analyst instructions, and the
+        documents most relevant to the message are sent along with it.
+        """
+        if not self._retrieval_top_k:
+            return self._get_model(agency), message
+
+        hits = self._get_index(agency).search(message, self._retrieval_top_k)
+        model = genai.GenerativeModel(
+            model_name=f"models/{RETRIEVAL_MODEL}",
+            system_instruction=generate_retrieval_prompt(),
+            tools=[FETCH_DOCUMENT_DETAILS, "google_search_retrieval"],
+        )
+        content = [genai.protos.Part(text=message)]
+        if hits:
+            documents = [doc for doc, _ in hits]
+            context = render_retrieved_documents(documents)
+            content.append(genai.protos.Part(text=context))
+        return model, content
+
+    def _warm_index(self, agency: str, max_age: datetime.timedelta) -> str:
+        path = index_path(agency)
+        exists = path.exists()
+        if exists and time.time() - path.stat().st_mtime < max_age.total_seconds():
+            return "fresh"
+
+        name = f"{agency}_index"
+        lock = self._acquire_build_lock(name)
+        if lock is None:
+            return "busy"
+        try:
+            build_agency_index(self._gov_api_key, agency)
+        finally:
+            self._release_build_lock(name, lock)
+        return "rebuilt" if exists else "built"
+
+    def _record_traffic(self, agency: str) -> None:
+        """
+        Counts a message for the agency in the current hourly traffic bucket.
+        """
+        key = f"agency_traffic:{datetime.datetime.now(datetime.timezone.utc):%Y%m%d%H}"
+        pipe = self.redis_client.pipeline()
+        pipe.zincrby(key, 1, agency)
+        pipe.expire(key, TRAFFIC_WINDOW_HOURS * 3600 + 3600)
+        pipe.execute()
+
+    def recent_traffic(self, hours: int = TRAFFIC_WINDOW_HOURS) -> dict:
+        """
+        Returns the number of messages per agency over the last `hours` hourly buckets.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        pipe = self.redis_client.pipeline()
+        for h in range(hours):
+            hour = now - datetime.timedelta(hours=h)
+            pipe.zrange(f"agency_traffic:{hour:%Y%m%d%H}", 0, -1, withscores=True)
+
+        traffic = {}
+        for bucket in pipe.execute():
+            for agency, count in bucket:
+                agency = agency.decode()
+                traffic[agency] = traffic.get(agency, 0) + count
+        return traffic
+
+    def warm_agency(
+        self,
+        agency: str,
+        refresh_margin: datetime.timedelta = datetime.timedelta(minutes=10),
+        max_age: datetime.timedelta = datetime.timedelta(hours=12),
+    ) -> str:
+        """
+        Makes sure the agency has a cached content that will outlive the next warm-up pass.
+
+        Caches older than `max_age` are rebuilt from a fresh prompt, however recently they
+        were used; younger ones expiring within `refresh_margin` get their TTL extended.
+        Missing caches are built. A rebuilt cache's predecessor is left to expire within
+        `SUPERSEDED_CACHE_TTL` rather than deleted, since other workers may be mid-turn on
+        it. In retrieval mode the agency's index is rebuilt instead once it is older than
+        `max_age`.
+
+        Returns:
+            str: What was done: "built", "rebuilt", "extended", "fresh", or "busy" when
+            another worker is already building the cache.
+        """
+        if self._retrieval_top_k:
+            return self._warm_index(agency, max_age)
+
+        name = f"{agency}_model"
+        now = datetime.datetime.now(datetime.timezone.utc)
+        # Uncached prompts are never extended, so their age follows from the TTL left
+        prompt_ttl = self.redis_client.ttl(f"model_prompt:{name}")
+        if prompt_ttl > refresh_margin.total_seconds():
+            age = UNCACHED_PROMPT_TTL.total_seconds() - prompt_ttl
+            if age < max_age.total_seconds():
+                return "fresh"
+        existing = self._find_model_cache(name)
+
+        # Age is checked first: the request path keeps busy agencies' caches from expiring
+        if existing and now - existing.cache.create_time < max_age:
+            if existing.expire_time - now > refresh_margin:
+                return "fresh"
+            existing.cache.update(ttl=MODEL_CACHE_TTL)
+            self._model_caches.register(name, existing.cache)
+            return "extended"
+
+        lock = self._acquire_build_lock(name)
+        if lock is None:
+            return "busy"
+        try:
+            self._build_model(name, agency)
+        finally:
+            self._release_build_lock(name, lock)
+
+        # The registry now points at the new cache; let the superseded one run out soon
+        if existing and existing.expire_time - now > SUPERSEDED_CACHE_TTL:
+            existing.cache.update(ttl=SUPERSEDED_CACHE_TTL)
+        return "rebuilt" if existing else "built"
+
+    def _handle_function_call(self, fn) -> Tuple[list, list]:
+        """
+        Executes one function call requested by the model.
+
+        Returns:
+            tuple: (response parts to send back to the model, attachments for the client)
+        """
+        print(f"Executing {fn.name}")
+        args = parse_args_to_dict(fn.args)
+        fn_res = execute_function_call(
+            fn.name, args, self._gov_api_key, cache=self._document_cache
+        )
+        result = fn_res.get("result") or {}
+        response_parts = []
+        attachments = []
+
+        # Check if PDF URL exists
+        if pdf_url := result.get("pdf_url"):
+            print(f"Adding PDF attachment: {pdf_url}")
+
+            # Append PDF attachment to attachments list
+            attachments.append(
+                {
+                    "type": "pdf",
+                    "title": pdf_url,
+                    "file_uri": pdf_url,
+                }
             )
-        return model
+
+            # Add PDF as a part of the response for the model, reusing earlier uploads
+            if pdf_file := self._uploads.get_or_upload(pdf_url):
+                response_parts.append(pdf_file)
+
+        # Handle other successful content
+        if fn_res.get("status") == "success" and result.get("content"):
+            result["type"] = "htm"
+            attachments.append(result)
+            response_parts.append(
+                genai.protos.Part(
+                    function_response=genai.protos.FunctionResponse(
+                        name=fn.name,
+                        response={
+                            "status": "success",
+                            "result": "pdf file attached",
+                            "error": None,
+                        },
+                    )
+                )
+            )
+            return response_parts, attachments
+
+        # Append function response for other outputs
+        response_parts.append(
+            genai.protos.Part(
+                function_response=genai.protos.FunctionResponse(
+                    name=fn.name, response=fn_res
+                )
+            )
+        )
+        return response_parts, attachments
+
+    def _replay_history(self, history: list) -> list:
+        """
+        Returns the part of a stored history to replay, compacted to the token budget.
+        """
+        if self._history_token_budget is None:
+            return history
+        return compact_history(history, self._history_token_budget)
+
+    def _tool_progress_message(self, name: str, args: dict) -> str:
+        try:
+            return TOOL_PROGRESS_MESSAGES[name].format(**args)
+        except KeyError:
+            return f"Running {name}"
+
+    def _warming_response(self, agency: str) -> dict:
+        return {
+            "text": WARMING_MESSAGE.format(agency=agency),
+            "attachments": [],
+            "status": "warming",
+        }
 
     def handle_message(self, session_id: str, agency: str, message: str) -> dict:
-        model = self._get_model(agency)
+        self._record_traffic(agency)
+        try:
+            model, content = self._prepare_turn(agency, message)
+        except ModelWarmingError:
+            return self._warming_response(agency)
 
         # Load history from Redis
-        cached_history = self._load_history(session_id)
+        cached_history = self._replay_history(
+            self._history.load(session_id, self._history_token_budget)
+        )
         chat = model.start_chat(
             history=cached_history,
             enable_automatic_function_calling=True,
         )
 
         # Send the user's message
-        res = chat.send_message(message)
+        res = chat.send_message(content)
         attachments = []
 
         # Process model responses
         while True:
             new_response_parts = []
 
-            for part in res.parts:
-                if fn := part.function_call:
-                    print(f"Executing {fn.name}")
-                    args = parse_args_to_dict(fn.args)
-                    fn_res = execute_function_call(fn.name, args, self._gov_api_key)
-                    result = fn_res.get("result")
-
-                    # Check if PDF URL exists
-                    if pdf_url := result.get("pdf_url"):
-                        print(f"Adding PDF attachment: {pdf_url}")
-
-                        # Append PDF attachment to attachments list
-                        attachments.append(
-                            {
-                                "type": "pdf",
-                                "title": pdf_url,
-                                "file_uri": pdf_url,
-                            }
-                        )
-
-                        response = requests.get(pdf_url)
-                        if response.status_code == 200:
-                            data = BytesIO(response.content)
-                            pdf_file = genai.upload_file(
-                                path=data,
-                                mime_type="application/pdf",
-                                display_name=pdf_url,
-                            )
-                            print(f"File uploaded successfully: {pdf_file}")
-
-                        # Add PDF as a part of the response for the model
-                        new_response_parts.append(pdf_file)
-
-                    # Handle other successful content
-                    if fn_res.get("status") == "success" and result.get("content"):
-                        resp = fn_res.get("result")
-                        resp["type"] = "htm"
-                        attachments.append(resp)
-                        new_response_parts.append(
-                            genai.protos.Part(
-                                function_response=genai.protos.FunctionResponse(
-                                    name=fn.name,
-                                    response={
-                                        "status": "success",
-                                        "result": "pdf file attached",
-                                        "error": None,
-                                    },
-                                )
-                            )
-                        )
-                        continue
-
-                    # Append function response for other outputs
-                    new_response_parts.append(
-                        genai.protos.Part(
-                            function_response=genai.protos.FunctionResponse(
-                                name=fn.name, response=fn_res
-                            )
-                        )
-                    )
+            # Run this turn's function calls concurrently; map() keeps the part order
+            function_calls = [part.function_call for part in res.parts if part.function_call]
+            for parts, fn_attachments in self._tool_executor.map(
+                self._handle_function_call, function_calls
+            ):
+                new_response_parts.extend(parts)
+                attachments.extend(fn_attachments)
 
             # If no new function calls, break the loop
             if not new_response_parts:
@@ -221,8 +598,8 @@ class Server:
             # Send function responses to the model
             res = chat.send_message(new_response_parts)
 
-        # Save updated history to Redis
-        self._save_history(session_id, chat.history)
+        # Append this turn's messages to the history in Redis
+        self._history.append(session_id, chat.history[len(cached_history) :])
 
         # Return the final response
         return {
@@ -230,5 +607,151 @@ class Server:
             "attachments": attachments,
         }
 
+    async def _run_blocking(self, func, *args):
+        """
+        Runs a blocking call (Gemini SDK, `requests`, file uploads) on the server's executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._blocking_executor, func, *args)
+
+    async def _record_traffic_async(self, agency: str) -> None:
+        key = f"agency_traffic:{datetime.datetime.now(datetime.timezone.utc):%Y%m%d%H}"
+        async with self.async_redis_client.pipeline() as pipe:
+            pipe.zincrby(key, 1, agency)
+            pipe.expire(key, TRAFFIC_WINDOW_HOURS * 3600 + 3600)
+            await pipe.execute()
+
+    async def stream_message(
+        self, session_id: str, agency: str, message: str
+    ) -> AsyncIterator[dict]:
+        """
+        Runs a message turn and yields its progress as events.
+
+        Events are dicts with an "event" name and "data" payload:
+            - "text": an incremental chunk of model output (`{"text": ...}`)
+            - "tool_call": a function call about to run (`{"name", "args", "message"}`)
+            - "attachment": an attachment produced by a function call
+            - "warming": the agency's model is not ready yet (payload as in `handle_message`)
+            - "done": the turn is complete and the history has been saved
+
+        Text from a round that ends in function calls is followed by "tool_call" events;
+        only the text of the last round is the final answer.
+        """
+        await self._record_traffic_async(agency)
+        try:
+            model, content = await self._run_blocking(
+                self._prepare_turn, agency, message
+            )
+        except ModelWarmingError:
+            yield {"event": "warming", "data": self._warming_response(agency)}
+            return
+
+        # Streaming cannot be combined with automatic function calling, which only applies
+        # to Python callables anyway; our tools are executed explicitly below.
+        cached_history = self._replay_history(
+            await self._async_history.load(session_id, self._history_token_budget)
+        )
+        chat = model.start_chat(history=cached_history)
+
+        while True:
+            res = await chat.send_message_async(content, stream=True)
+            async for chunk in res:
+                for part in chunk.parts:
+                    if part.text:
+                        yield {"event": "text", "data": {"text": part.text}}
+
+            function_calls = [part.function_call for part in res.parts if part.function_call]
+            for fn in function_calls:
+                args = parse_args_to_dict(fn.args)
+                yield {
+                    "event": "tool_call",
+                    "data": {
+                        "name": fn.name,
+                        "args": args,
+                        "message": self._tool_progress_message(fn.name, args),
+                    },
+                }
+
+            # Run this turn's function calls concurrently; gather() keeps the part order
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        self._tool_executor, self._handle_function_call, fn
+                    )
+                    for fn in function_calls
+                )
+            )
+
+            content = []
+            for parts, fn_attachments in results:
+                content.extend(parts)
+                for attachment in fn_attachments:
+                    yield {"event": "attachment", "data": attachment}
+
+            # If no new function calls, the turn is complete
+            if not content:
+                break
+
+        await self._async_history.append(
+            session_id, chat.history[len(cached_history) :]
+        )
+        yield {"event": "done", "data": {}}
+
+    async def handle_message_async(
+        self, session_id: str, agency: str, message: str
+    ) -> dict:
+        """
+        Event-loop friendly version of `handle_message`, built on `stream_message`.
+
+        Redis and Gemini calls are awaited natively; model lookup and the tool functions,
+        which use blocking clients, run on the server's bounded executor.
+        """
+        text = []
+        attachments = []
+        async for event in self.stream_message(session_id, agency, message):
+            if event["event"] == "warming":
+                return event["data"]
+            if event["event"] == "text":
+                text.append(event["data"]["text"])
+            elif event["event"] == "tool_call":
+                # Text before a function call is not part of the final answer
+                text = []
+            elif event["event"] == "attachment":
+                attachments.append(event["data"])
+
+        return {
+            "text": "".join(text),
+            "attachments": attachments,
+        }
+
     def fetch_news(self, query: str) -> dict:
-        return fetch_news_with_query(self._news_api_key, query)
+        return self._news_cache.get(
+            query,
+            lambda: fetch_news_with_query(self._news_api_key, query),
+        )
+
+    def stats(self) -> dict:
+        """
+        Returns cache counters and the latest prompt decision per agency for monitoring.
+        """
+        return {
+            "document_cache": self._document_cache.stats(),
+            "news_cache": self._news_cache.stats(),
+            "http_cache": http_cache.stats(),
+            "prompt_fragments": fragment_cache.stats(),
+            "prompts": {
+                agency.decode(): json.loads(decision)
+                for agency, decision in self.redis_client.hgetall(
+                    "prompt_decisions"
+                ).items()
+            },
+        }
+
+    async def fetch_news_async(self, query: str) -> dict:
+        return await self._run_blocking(self.fetch_news, query)
+
+    async def aclose(self) -> None:
+        await self.async_redis_client.aclose()
+        self._blocking_executor.shutdown(wait=False)
+        self._tool_executor.shutdown(wait=False)
@@ -1,7 +1,9 @@
+import json
 import inspect
 import google.generativeai as genai
 
 from src.agencies import fetch_document_details
+from src.ratelimit import INTERACTIVE, request_priority
 
 
 FETCH_DOCUMENT_DETAILS = genai.protos.Tool(
@@ -31,6 +33,9 @@ FETCH_DOCUMENT_DETAILS = genai.protos.Tool(
     ]
 )
 
+# Functions whose results depend only on their arguments and may be cached
+CACHEABLE_FUNCTIONS = {"fetch_document_details"}
+
 FETCH_LATEST_NEWS = genai.protos.Tool(
     function_declarations=[
         genai.protos.FunctionDeclaration(
@@ -77,7 +82,12 @@ def parse_args_to_dict(args):
     return args_dict
 
 
-def execute_function_call(function_name, function_args, api_key):
+def _call_interactive(func, function_args):
+    with request_priority(INTERACTIVE):
+        return func(**function_args)
+
+
+def execute_function_call(function_name, function_args, api_key, cache=None):
     """
     Verifies the function signature and executes it dynamically.
 
@@ -85,6 +95,8 @@ def execute_function_call(function_name, function_args, api_key):
         function_name (str): The name of the function to call.
         function_args (dict): The arguments to pass to the function.
         api_key (str): The API key used to make the request.
+        cache (ResultCache, optional): Cache for results of functions listed in
+            `CACHEABLE_FUNCTIONS`, keyed by their arguments (the API key excluded).
 
     Returns:
         dict: A JSON response containing the result or error message.
@@ -119,8 +131,16 @@ def execute_function_call(function_name, function_args, api_key):
             response["error"] = f"Argument mismatch: {str(e)}"
             return response
 
-        # Step 3: Call the function with validated arguments
-        response["result"] = func(**function_args)
+        # Step 3: Call the function with validated arguments; a user is waiting on it,
+        # so its API requests go ahead of background crawls
+        if cache is not None and function_name in CACHEABLE_FUNCTIONS:
+            key_args = {k: v for k, v in function_args.items() if k != "api_key"}
+            response["result"] = cache.get_or_compute(
+                f"{function_name}:{json.dumps(key_args, sort_keys=True)}",
+                lambda: _call_interactive(func, function_args),
+            )
+        else:
+            response["result"] = _call_interactive(func, function_args)
         return response
 
     except Exception as e:
@@ -0,0 +1,106 @@
+import json
+import hashlib
+import datetime
+import tempfile
+from typing import Optional
+
+import requests
+import google.generativeai as genai
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Stop handing out a file this long before Gemini deletes it, so a chat never
+# references a file that expires mid-turn.
+EXPIRY_MARGIN = datetime.timedelta(hours=1)
+
+
+def _url_key(url: str) -> str:
+    return f"upload:url:{hashlib.sha256(url.encode()).hexdigest()}"
+
+
+def _content_key(digest: str) -> str:
+    return f"upload:sha256:{digest}"
+
+
+def _file_part(record: dict) -> genai.protos.Part:
+    return genai.protos.Part(
+        file_data=genai.protos.FileData(
+            mime_type=record["mime_type"], file_uri=record["uri"]
+        )
+    )
+
+
+class UploadCache:
+    """
+    Reuses Gemini file uploads across sessions and workers.
+
+    Uploaded files are recorded in Redis by source URL and by content hash until shortly
+    before Gemini expires them. A known URL costs no download at all; a new URL whose
+    content was already uploaded under another URL costs a download but no upload.
+    Downloads are streamed to a temporary file instead of being buffered in memory.
+    """
+
+    def __init__(self, redis_client, session: Optional[requests.Session] = None) -> None:
+        self.redis_client = redis_client
+        self._session = session or requests.Session()
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        raw = self.redis_client.get(key)
+        return json.loads(raw) if raw else None
+
+    def _remember(self, url: str, record: dict) -> None:
+        expires = datetime.datetime.fromisoformat(record["expiration_time"])
+        ttl = expires - EXPIRY_MARGIN - datetime.datetime.now(datetime.timezone.utc)
+        if ttl.total_seconds() <= 0:
+            return
+        pipe = self.redis_client.pipeline()
+        pipe.set(_url_key(url), json.dumps(record), ex=ttl)
+        pipe.set(_content_key(record["sha256"]), json.dumps(record), ex=ttl)
+        pipe.execute()
+
+    def get_or_upload(
+        self, url: str, mime_type: str = "application/pdf"
+    ) -> Optional[genai.protos.Part]:
+        """
+        Returns a file part for the document at `url`, uploading it only if needed.
+
+        Args:
+            url (str): Source URL of the file.
+            mime_type (str): MIME type to upload the file with.
+
+        Returns:
+            genai.protos.Part: A `file_data` part referencing the uploaded file, or None if
+            the download failed.
+        """
+        if record := self._lookup(_url_key(url)):
+            print(f"Reusing uploaded file for {url}")
+            return _file_part(record)
+
+        with tempfile.NamedTemporaryFile(suffix=".upload") as tmp:
+            digest = hashlib.sha256()
+            with self._session.get(url, stream=True) as response:
+                if response.status_code != 200:
+                    print(f"Failed to download {url}: HTTP {response.status_code}")
+                    return None
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            tmp.flush()
+            digest = digest.hexdigest()
+
+            if record := self._lookup(_content_key(digest)):
+                print(f"Reusing uploaded file with identical content for {url}")
+            else:
+                uploaded = genai.upload_file(
+                    path=tmp.name, mime_type=mime_type, display_name=url
+                )
+                print(f"File uploaded successfully: {uploaded.name}")
+                record = {
+                    "name": uploaded.name,
+                    "uri": uploaded.uri,
+                    "mime_type": uploaded.mime_type or mime_type,
+                    "sha256": digest,
+                    "expiration_time": uploaded.expiration_time.isoformat(),
+                }
+
+        self._remember(url, record)
+        return _file_part(record)
@@ -0,0 +1,93 @@
+import os
+import time
+import datetime
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from src.server import Server
+
+AGENCY_ICONS_DIR = Path(__file__).resolve().parent.parent / "webui" / "public" / "agencies"
+
+
+def default_agencies() -> List[str]:
+    """
+    Returns the agencies to keep warm: `WARMUP_AGENCIES` (comma-separated) if set,
+    otherwise every agency the web UI offers.
+    """
+    configured = os.getenv("WARMUP_AGENCIES")
+    if configured:
+        return [agency.strip() for agency in configured.split(",") if agency.strip()]
+    return sorted(icon.stem for icon in AGENCY_ICONS_DIR.glob("*.svg"))
+
+
+class WarmupScheduler:
+    """
+    Periodically pre-builds and refreshes agency model caches so that requests never
+    have to build them.
+
+    Each pass visits the configured agencies busiest-first (by recent message traffic),
+    so the agencies users are actually talking to are refreshed before the long tail.
+    """
+
+    def __init__(
+        self,
+        server: Server,
+        agencies: Optional[List[str]] = None,
+        interval: int = 300,
+        refresh_margin: datetime.timedelta = datetime.timedelta(minutes=10),
+        max_age: datetime.timedelta = datetime.timedelta(hours=12),
+    ) -> None:
+        self.server = server
+        self.agencies = agencies or default_agencies()
+        self.interval = interval
+        self.refresh_margin = refresh_margin
+        self.max_age = max_age
+        self._stop = threading.Event()
+        self._thread = None
+
+    def prioritized_agencies(self) -> List[str]:
+        traffic = self.server.recent_traffic()
+        return sorted(self.agencies, key=lambda agency: -traffic.get(agency, 0))
+
+    def run_once(self) -> None:
+        for agency in self.prioritized_agencies():
+            if self._stop.is_set():
+                return
+            try:
+                action = self.server.warm_agency(
+                    agency, refresh_margin=self.refresh_margin, max_age=self.max_age
+                )
+                print(f"Warm-up {agency}: {action}")
+            except Exception as e:
+                print(f"Warm-up {agency} failed: {e}")
+
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.run_once()
+            self._stop.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self.run_forever, name="agency-warmup", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    import dotenv
+
+    dotenv.load_dotenv()
+
+    server = Server(
+        gov_api_key=os.getenv("GOV_API_KEY"),
+        genai_api_key=os.getenv("GENAI_API_KEY"),
+        news_api_key=os.getenv("NEWS_API_KEY"),
+    )
+    WarmupScheduler(server).run_forever()
@@ -0,0 +1,184 @@
+"""
+Agency listing against a fake Regulations.gov that enforces the API's page cap.
+"""
+
+import math
+import threading
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import requests
+
+from src import agencies
+from src.agencies import (
+    MAX_LISTING_RESULTS,
+    MAX_PAGE_NUMBER,
+    fetch_agency,
+    iter_agency_pages,
+)
+
+TYPES = ["Notice", "Rule", "Proposed Rule", "Supporting & Related Material"]
+BUSY_DAY = date(2022, 6, 15)
+
+
+def listing_entry(doc_id, posted, doc_type):
+    return {
+        "id": doc_id,
+        "attributes": {
+            "agencyId": "AG",
+            "documentType": doc_type,
+            "postedDate": f"{posted.isoformat()}T04:00:00Z",
+            "lastModifiedDate": f"{posted.isoformat()}T12:00:00Z",
+            "title": f"Document {doc_id}",
+        },
+    }
+
+
+def spread(count, start=date(2021, 1, 1), days=3 * 365, prefix="AG"):
+    return [
+        listing_entry(
+            f"{prefix}-{i:05d}", start + timedelta(days=i * days // count), TYPES[i % 4]
+        )
+        for i in range(count)
+    ]
+
+
+class FakeResponse:
+    def __init__(self, url, status_code, body):
+        self.url = url
+        self.status_code = status_code
+        self._body = body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} for {self.url}", response=self)
+
+    def json(self):
+        return self._body
+
+
+class FakeListingSession:
+    """
+    Serves `/v4/documents` listings from memory, refusing pages past the cap.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        query = {key: values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+        with self._lock:
+            self.requests.append(query)
+
+        page = int(query["page[number]"])
+        size = int(query["page[size]"])
+        if page > MAX_PAGE_NUMBER:
+            return FakeResponse(url, 400, {"errors": [{"detail": "page[number] too large"}]})
+
+        types = query["filter[documentType]"].split(",")
+        ge = query.get("filter[postedDate][ge]", "0000-00-00")
+        le = query.get("filter[postedDate][le]", "9999-99-99")
+        matches = [
+            entry
+            for entry in self.entries
+            if entry["attributes"]["documentType"] in types
+            and ge <= entry["attributes"]["postedDate"][:10] <= le
+        ]
+        for field in reversed(query.get("sort", "-postedDate").split(",")):
+            key = field.lstrip("-")
+            name = "id" if key == "documentId" else key
+            matches.sort(
+                key=lambda e: e["id"] if name == "id" else e["attributes"][name],
+                reverse=field.startswith("-"),
+            )
+
+        body = {
+            "data": matches[(page - 1) * size : page * size],
+            "meta": {
+                "totalElements": len(matches),
+                "totalPages": math.ceil(len(matches) / size),
+            },
+        }
+        return FakeResponse(url, 200, body)
+
+    def pages(self, **filters):
+        return [
+            query
+            for query in self.requests
+            if all(query.get(key) == value for key, value in filters.items())
+        ]
+
+
+@pytest.fixture
+def listing(monkeypatch):
+    def install(entries):
+        session = FakeListingSession(entries)
+        monkeypatch.setattr(agencies, "_get_session", lambda streaming=False: session)
+        return session
+
+    return install
+
+
+def expected_ids(entries):
+    return {e["id"] for e in entries if e["attributes"]["documentType"] in TYPES[:3]}
+
+
+def test_small_listing_is_paged_in_order(listing):
+    entries = spread(1_000)
+    session = listing(entries)
+
+    docs = fetch_agency("key", "AG", max_workers=4)
+
+    newest_first = sorted(
+        (e for e in entries if e["id"] in expected_ids(entries)),
+        key=lambda e: e["attributes"]["postedDate"],
+        reverse=True,
+    )
+    assert [doc.id for doc in docs] == [e["id"] for e in newest_first]
+    assert len(session.pages(**{"page[number]": "1"})) == 1
+    assert not session.pages(sort="postedDate,documentId")
+
+
+def test_async_listing_matches_sync(listing):
+    listing(spread(1_000))
+    sync = [doc.id for doc in fetch_agency("key", "AG", max_workers=4)]
+    assert [doc.id for doc in fetch_agency("key", "AG", use_async=True)] == sync
+
+
+def test_large_listing_is_split_into_windows_under_the_cap(listing):
+    # Of 9,000 documents posted on a single day, 6,750 are listed: over the cap, but
+    # within reach of the forward and reverse listings of that day
+    entries = spread(4_000) + spread(9_000, start=BUSY_DAY, days=1, prefix="AG-B")
+    session = listing(entries)
+
+    pages = list(iter_agency_pages("key", "AG", max_workers=4))
+    ids = [doc.id for _, docs in pages for doc in docs]
+
+    assert len(ids) == len(set(ids))
+    assert set(ids) == expected_ids(entries)
+    assert max(int(query["page[number]"]) for query in session.requests) <= MAX_PAGE_NUMBER
+
+    windows = {
+        (query["filter[postedDate][ge]"], query["filter[postedDate][le]"])
+        for query in session.pages(sort="postedDate,documentId")
+    }
+    assert len(windows) > 3  # the busy window was split again
+    busy = BUSY_DAY.isoformat()
+    assert (busy, busy) in windows
+    reverse = session.pages(sort="postedDate,-documentId")
+    assert reverse
+    assert {(q["filter[postedDate][ge]"], q["filter[postedDate][le]"]) for q in reverse} == {
+        (busy, busy)
+    }
+
+
+def test_unsharded_listing_stops_at_the_cap(listing):
+    entries = spread(8_000)
+    listing(entries)
+    assert len(expected_ids(entries)) > MAX_LISTING_RESULTS
+
+    with pytest.raises(requests.HTTPError):
+        fetch_agency("key", "AG", sharded=False, max_workers=4)
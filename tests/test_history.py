@@ -0,0 +1,213 @@
+"""
+History record format, selective blob loading and replay compaction.
+"""
+
+import warnings
+
+import pytest
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", FutureWarning)
+    import google.generativeai as genai
+
+from src.history import (
+    BLOB_THRESHOLD,
+    HISTORY_MAX_RECORDS,
+    KEEP_RECENT_TURNS,
+    OMITTED_RESPONSE,
+    HistoryStore,
+    _LoadPlan,
+    _blob_key,
+    _encode_messages,
+    compact_history,
+    decode_records,
+    encode_content,
+    estimate_history_tokens,
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+P = genai.protos
+BULKY = "x" * (2 * BLOB_THRESHOLD)
+
+
+def user(text):
+    return P.Content(role="user", parts=[P.Part(text=text)])
+
+
+def model(text):
+    return P.Content(role="model", parts=[P.Part(text=text)])
+
+
+def call(name, **args):
+    return P.Content(
+        role="model", parts=[P.Part(function_call=P.FunctionCall(name=name, args=args))]
+    )
+
+
+def result(name, value):
+    return P.Content(
+        role="user",
+        parts=[
+            P.Part(
+                function_response=P.FunctionResponse(name=name, response={"result": value})
+            )
+        ],
+    )
+
+
+def tool_turn(i, answer="done"):
+    """
+    One question answered through a tool call with a bulky result.
+    """
+    return [
+        user(f"question {i}"),
+        call("fetch_document_details", link=f"doc-{i}"),
+        result("fetch_document_details", BULKY + str(i)),
+        model(f"{answer} {i}"),
+    ]
+
+
+def as_json(history):
+    return [P.Content.to_json(content) for content in history]
+
+
+def test_small_parts_are_inline():
+    record, blobs = encode_content(user("hello"))
+    assert blobs == {}
+    assert as_json(decode_records([record], {})) == as_json([user("hello")])
+
+
+def test_round_trip_with_blobs():
+    messages = tool_turn(0) + [model(BULKY)] + tool_turn(1)
+    records, blobs = _encode_messages(messages)
+    assert len(blobs) == 3  # two tool results and the long answer
+    assert all(len(record) < BLOB_THRESHOLD for record in records)
+    assert as_json(decode_records(records, blobs)) == as_json(messages)
+
+
+def test_repeated_payloads_are_stored_once():
+    records, blobs = _encode_messages([result("f", BULKY), result("f", BULKY)])
+    assert len(records) == 2
+    assert len(blobs) == 1
+
+
+def test_expired_blob_falls_back_to_its_stub():
+    records, _ = _encode_messages(tool_turn(0))
+    history = decode_records(records, {})
+    response = history[2].parts[0].function_response
+    assert response.name == "fetch_document_details"
+    assert dict(response.response) == OMITTED_RESPONSE
+
+
+def test_expired_blob_without_stub_is_an_error():
+    records, _ = _encode_messages([user("question"), model(BULKY)])
+    with pytest.raises(ValueError):
+        decode_records(records, {})
+
+
+def test_plan_fetches_every_blob_while_under_budget():
+    records, blobs = _encode_messages(tool_turn(0) + tool_turn(1) + tool_turn(2))
+    plan = _LoadPlan(records, token_budget=10**6)
+    assert set(plan.digests()) == set(blobs)
+
+
+def test_plan_fetches_only_recent_turn_blobs_over_budget():
+    turns = [tool_turn(i) for i in range(5)]
+    records, _ = _encode_messages([m for turn in turns for m in turn])
+    plan = _LoadPlan(records, token_budget=1_000, keep_recent_turns=2)
+
+    recent = [encode_content(turn[2])[1] for turn in turns[-2:]]
+    assert set(plan.digests()) == {d for blobs in recent for d in blobs}
+
+    history = plan.resolve({})
+    replayed = [m.parts[0].function_response for m in history if m.parts[0].function_response]
+    assert [dict(r.response) == OMITTED_RESPONSE for r in replayed] == [True] * 5
+
+
+def test_plan_always_fetches_blobs_without_stub():
+    messages = [user("q0"), model(BULKY)] + tool_turn(1) + tool_turn(2) + tool_turn(3)
+    records, blobs = _encode_messages(messages)
+    plan = _LoadPlan(records, token_budget=1_000, keep_recent_turns=1)
+    long_answer = next(iter(encode_content(model(BULKY))[1]))
+    assert long_answer in plan.digests()
+    assert as_json(plan.resolve(blobs))[1] == as_json([model(BULKY)])[0]
+
+
+def test_store_reads_only_replayed_blobs():
+    redis_client = fakeredis.FakeStrictRedis()
+    store = HistoryStore(redis_client)
+    for i in range(6):
+        store.append("s", tool_turn(i))
+
+    # Blobs of turns outside the replayed ones are never read, so losing them is harmless
+    for i in range(4):
+        for digest in encode_content(tool_turn(i)[2])[1]:
+            redis_client.delete(_blob_key(digest))
+
+    history = store.load("s", token_budget=1_000)
+    assert len(history) == 24
+    assert history[-2].parts[0].function_response.response["result"] == BULKY + "5"
+    assert dict(history[2].parts[0].function_response.response) == OMITTED_RESPONSE
+
+
+def test_store_trims_to_whole_turns():
+    redis_client = fakeredis.FakeStrictRedis()
+    store = HistoryStore(redis_client)
+    turns = HISTORY_MAX_RECORDS // 4 + 1
+    for i in range(turns):
+        store.append("s", [user(f"question {i}"), call("f"), result("f", "ok"), model("answer")])
+    # A 3-message first turn keeps the trimmed list from lining up with turn boundaries
+    store.append("s", [user("last"), call("f"), model("answer")])
+
+    assert redis_client.llen("history:s") == HISTORY_MAX_RECORDS
+    history = store.load("s")
+    assert history[0].role == "user" and history[0].parts[0].text.startswith("question")
+    assert history[-3].parts[0].text == "last"
+
+
+def test_compaction_leaves_a_history_under_budget_alone():
+    history = tool_turn(0) + tool_turn(1)
+    assert compact_history(history, token_budget=10**6) is history
+
+
+@pytest.mark.parametrize("older_turns", [1, 3, 12])
+def test_compaction_stays_under_budget_and_keeps_recent_turns(older_turns):
+    history = [m for i in range(older_turns + KEEP_RECENT_TURNS) for m in tool_turn(i)]
+    recent = history[-4 * KEEP_RECENT_TURNS:]
+    budget = estimate_history_tokens(recent) + 200
+
+    compacted = compact_history(history, token_budget=budget)
+
+    assert estimate_history_tokens(compacted) <= budget
+    assert as_json(compacted[-len(recent):]) == as_json(recent)
+    older = compacted[: -len(recent)]
+    assert all(
+        dict(part.function_response.response) == OMITTED_RESPONSE
+        for content in older
+        for part in content.parts
+        if part.function_response
+    )
+
+
+def test_compaction_summarizes_dropped_turns():
+    history = [m for i in range(12) for m in tool_turn(i)]
+    budget = estimate_history_tokens(history[-4 * KEEP_RECENT_TURNS:]) + 150
+    compacted = compact_history(history, token_budget=budget)
+
+    assert estimate_history_tokens(compacted) <= budget
+    summary = compacted[0].parts[0].text
+    assert summary.startswith("Summary of earlier conversation")
+    assert "question 9" in summary and "done 9" in summary
+    assert compacted[1].role == "model"
+
+
+def test_compaction_stubs_older_results_before_dropping_turns():
+    history = tool_turn(0) + tool_turn(1) + tool_turn(2)
+    budget = estimate_history_tokens(history[-4:]) + estimate_history_tokens(history[:4]) // 2
+    compacted = compact_history(history, token_budget=budget, keep_recent_turns=1)
+
+    assert estimate_history_tokens(compacted) <= budget
+    assert [m.parts[0].text for m in compacted[:1]] == ["question 0"]
+    assert dict(compacted[2].parts[0].function_response.response) == OMITTED_RESPONSE
+    assert as_json(compacted[-4:]) == as_json(history[-4:])
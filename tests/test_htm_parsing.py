@@ -0,0 +1,269 @@
+"""
+Parity of the regex/streaming .htm parser with the former BeautifulSoup implementation.
+"""
+
+import random
+import re
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+
+import pytest
+
+from src.agencies import _stream_summary, _stream_summary_in_pool, parse_htm
+
+BeautifulSoup = pytest.importorskip("bs4").BeautifulSoup
+
+
+def reference_parse(raw_html, return_summary_only=False):
+    """
+    The former `download_and_parse_htm`, minus the download.
+    """
+    soup = BeautifulSoup(raw_html, "html.parser")
+
+    pre_tag = soup.find("pre")
+    if not pre_tag:
+        raise ValueError("No <PRE> tag found in the document.")
+    raw_text = pre_tag.get_text(separator="\n")
+
+    removable_patterns = [
+        r"^\[\s*Federal Register.*?\]\s*$",
+        r"^\[\s*DOCID:.*?\]\s*$",
+        r"^\s*\[Page.*?\]\s*$",
+        r"^BILLING CODE.*?$",
+        r"From the Federal Register Online.*?$",
+        r"^\[FR Doc.*?\]\s*$",
+        r"\s*_{3,}\s*$",
+        r"^\s+$",
+    ]
+
+    cleaned_lines = []
+    for line in raw_text.split("\n"):
+        if any(re.match(pattern, line) for pattern in removable_patterns):
+            continue
+        line = re.sub(r"\s+", " ", line).strip()
+        if line:
+            cleaned_lines.append(line)
+
+    if return_summary_only:
+        summary_lines = []
+        in_summary = False
+        for line in cleaned_lines:
+            if line.startswith("SUMMARY:"):
+                in_summary = True
+                summary_lines.append(line.replace("SUMMARY:", "").strip())
+            elif in_summary:
+                if not line or line.endswith(":"):
+                    break
+                summary_lines.append(line)
+        return " ".join(summary_lines).strip() if summary_lines else "Summary not found."
+
+    cleaned_text = "\n".join(cleaned_lines)
+    cleaned_text = re.sub(r"\n{3,}", "\n\n", cleaned_text)
+    cleaned_text = re.sub(r"(\w+:)\s+", r"\1 ", cleaned_text)
+    return cleaned_text.strip()
+
+
+class FakeResponse:
+    def __init__(self, text, encoding="utf-8"):
+        self.text = text
+        self.encoding = encoding
+        self.read = 0
+
+    def iter_content(self, chunk_size, decode_unicode=False):
+        body = self.text if decode_unicode else self.text.encode(self.encoding)
+        for start in range(0, len(body), chunk_size):
+            self.read = start + chunk_size
+            yield body[start : start + chunk_size]
+
+
+class InlinePool(Executor):
+    """
+    Runs submitted calls in the caller, counting them.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.calls += 1
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+FEDERAL_REGISTER_PAGE = """<html>
+<head><title>Federal Register, Volume 89 Issue 12</title></head>
+<body>
+<pre>
+[Federal Register Volume 89, Number 12 (Thursday, January 18, 2024)]
+[Rules and Regulations]
+[Pages 3321-3329]
+From the Federal Register Online via the Government Publishing Office [<a href="https://www.gpo.gov">www.gpo.gov</a>]
+[FR Doc No: 2024-00812]
+
+-----------------------------------------------------------------------
+
+ENVIRONMENTAL PROTECTION AGENCY
+
+40 CFR Part 52
+
+[EPA-R05-OAR-2023-0123; FRL-11412-02-R5]
+
+
+Air Plan Approval; Ohio; Ozone &amp; Particulate Matter
+
+AGENCY: Environmental Protection Agency (EPA).
+
+ACTION: Final rule.
+
+-----------------------------------------------------------------------
+
+SUMMARY: The Environmental Protection Agency (EPA) is approving a
+revision to the Ohio State Implementation Plan (SIP) submitted on
+March 3, 2023. The revision updates the state&#x27;s rules for
+<b>volatile organic compound</b> emissions &lt;VOC&gt;.
+
+DATES: This final rule is effective on February 20, 2024.
+
+ADDRESSES: EPA has established a docket for this action under Docket ID
+No. EPA-R05-OAR-2023-0123.
+
+[[Page 3322]]
+
+FOR FURTHER INFORMATION CONTACT:
+    Jane Doe, Air Programs Branch (AR-18J), (312) 555-0100.
+
+SUPPLEMENTARY INFORMATION:
+
+I. Background
+<!-- internal note: not part of the text -->
+    On March 3, 2023, Ohio submitted   a revision.    Section:
+    (a)  applies to all sources.
+_______________________________________________________________________
+
+[FR Doc. 2024-00812 Filed 1-17-24; 8:45 am]
+BILLING CODE 6560-50-P
+</pre>
+</body>
+</html>
+"""
+
+FIXTURE_PAGES = {
+    "federal_register": FEDERAL_REGISTER_PAGE,
+    "uppercase_tags": FEDERAL_REGISTER_PAGE.replace("<pre>", "<PRE>").replace(
+        "</pre>", "</PRE>"
+    ),
+    "no_summary": "<html><body><pre>\nAGENCY: Department of Labor.\n\nACTION: Notice.\n</pre></body></html>",
+    "summary_at_end": "<pre>\nACTION: Notice.\nSUMMARY: A short notice\nthat ends the page.\n</pre>",
+    "two_pre_blocks": "<pre>SUMMARY: First block.\nDATES: none.</pre><pre>SUMMARY: Second block.</pre>",
+    "unclosed_pre": "<pre>\nSUMMARY: The page was\ncut off before the end",
+    "attributes_and_entities": '<pre class="fr" id="x">\nSUMMARY: Caf&eacute; &amp; bar &nbsp;rules\n<a href="#p">see</a> page.\n\nDATES:\n</pre>',
+    "label_wrapping": "<pre>\nSUMMARY: Text.\n\nAUTHORITY:\n    42 U.S.C. 7401.\nNote:   spaced\n</pre>",
+}
+
+
+@pytest.mark.parametrize("name", sorted(FIXTURE_PAGES))
+def test_full_text_matches_reference(name):
+    page = FIXTURE_PAGES[name]
+    assert parse_htm(page)[1] == reference_parse(page)
+
+
+@pytest.mark.parametrize("name", sorted(FIXTURE_PAGES))
+def test_summary_matches_reference(name):
+    page = FIXTURE_PAGES[name]
+    assert parse_htm(page)[0] == reference_parse(page, return_summary_only=True)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16, 64, 1024])
+@pytest.mark.parametrize("name", sorted(FIXTURE_PAGES))
+def test_stream_summary_matches_reference(name, chunk_size):
+    page = FIXTURE_PAGES[name]
+    assert _stream_summary(FakeResponse(page), chunk_size) == reference_parse(
+        page, return_summary_only=True
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16, 64, 1024])
+@pytest.mark.parametrize("name", sorted(FIXTURE_PAGES))
+def test_pool_summary_matches_reference(name, chunk_size):
+    page = FIXTURE_PAGES[name]
+    assert _stream_summary_in_pool(
+        FakeResponse(page), InlinePool(), chunk_size
+    ) == reference_parse(page, return_summary_only=True)
+
+
+def test_pool_summary_stops_reading_after_the_summary():
+    page = FEDERAL_REGISTER_PAGE.replace(
+        "</pre>", "Filler line of the rule text.\n" * 100_000 + "</pre>"
+    )
+    response = FakeResponse(page)
+    pool = InlinePool()
+    summary = _stream_summary_in_pool(response, pool, 1024)
+    assert summary == reference_parse(page, return_summary_only=True)
+    assert response.read <= 4096
+    assert pool.calls == 1
+
+
+def test_pool_summary_in_a_process_pool():
+    page = FIXTURE_PAGES["federal_register"]
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        summary = _stream_summary_in_pool(FakeResponse(page), pool, 64)
+    assert summary == reference_parse(page, return_summary_only=True)
+
+
+def test_missing_pre_block_is_an_error():
+    page = "<html><body><p>No preformatted text</p></body></html>"
+    with pytest.raises(ValueError):
+        parse_htm(page)
+    with pytest.raises(ValueError):
+        _stream_summary(FakeResponse(page), 8)
+    with pytest.raises(ValueError):
+        _stream_summary_in_pool(FakeResponse(page), InlinePool(), 8)
+
+
+_PIECES = [
+    "SUMMARY: ",
+    "DATES:",
+    "ACTION: Final rule.",
+    "Note:",
+    "[[Page 12]]",
+    "[Federal Register Volume 1]",
+    "[DOCID: fr01ja24-1]",
+    "BILLING CODE 1234",
+    "[FR Doc. 2024-1 Filed]",
+    "_____",
+    "From the Federal Register Online",
+    "<b>bold</b>",
+    '<a href="x">link</a>',
+    "<br/>",
+    "<!-- comment -->",
+    "&amp;",
+    "&lt;tag&gt;",
+    "&#x27;",
+    "   ",
+    "\t",
+    "\n",
+    "\n\n\n",
+    "word",
+    "Section:",
+    "ends with colon:",
+    "plain text line",
+]
+
+
+def _random_page(rng):
+    body = "".join(rng.choice(_PIECES) for _ in range(rng.randint(0, 60)))
+    return f"<html><body><p>intro</p><pre>{body}</pre><p>outro</p></body></html>"
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_pages_match_reference(seed):
+    rng = random.Random(seed)
+    page = _random_page(rng)
+    summary, text = parse_htm(page)
+    assert text == reference_parse(page)
+    assert summary == reference_parse(page, return_summary_only=True)
+    assert _stream_summary(FakeResponse(page), rng.randint(1, 40)) == summary
+    assert (
+        _stream_summary_in_pool(FakeResponse(page), InlinePool(), rng.randint(1, 40))
+        == summary
+    )